@@ -3,13 +3,62 @@ import logging
 import click
 from .server import build_application
 from .configs import SERVER_VERSION, SERVER_LOCALHOST, UVICORN_LOGGING_CONFIG
+from .logs import configure_logging
+from .routing import parse_database_spec
+from .sessions import BoundedSessionManager
+from .http_compression import CompressionMiddleware, CompressionStats
+from starlette.middleware import Middleware
 
 __version__ = SERVER_VERSION
 
 logger = logging.getLogger("mcp_server_motherduck")
-logging.basicConfig(
-    level=logging.INFO, format="[motherduck] %(levelname)s - %(message)s"
-)
+configure_logging()
+
+
+def server_options(params: dict) -> dict:
+    """`build_application` arguments for the parsed command line options of `main`"""
+    return dict(
+        db_path=params["db_path"],
+        motherduck_token=params["motherduck_token"],
+        home_dir=params["home_dir"],
+        saas_mode=params["saas_mode"],
+        read_only=params["read_only"],
+        replica_tables=[t.strip() for t in params["replica_tables"].split(",") if t.strip()]
+        if params["replica_tables"]
+        else None,
+        replica_path=params["replica_path"],
+        replica_refresh_seconds=params["replica_refresh_seconds"],
+        summarize_rows=params["summarize_rows"],
+        summarize_bytes=params["summarize_bytes"],
+        stateful_sessions=params["stateful"] and params["transport"] == "stream",
+        max_sessions=params["max_sessions"],
+        max_concurrent_queries=params["max_concurrent_queries"],
+        max_queries_per_client=params["max_queries_per_client"],
+        max_queued_queries=params["max_queued_queries"],
+        queue_timeout=params["queue_timeout"],
+        query_settings={
+            name: str(value)
+            for name, value in (
+                ("memory_limit", params["query_memory_limit"]),
+                ("threads", params["query_threads"]),
+            )
+            if value is not None
+        },
+        threads=params["threads"],
+        memory_limit=params["memory_limit"],
+        temp_directory=params["temp_directory"],
+        enable_object_cache=params["object_cache"],
+        log_sql_max_chars=params["log_sql_max_chars"],
+        log_list_sample_rate=params["log_list_sample_rate"],
+        export_dir=params["export_dir"],
+        preflight_max_rows=params["preflight_max_rows"],
+        preflight_action=params["preflight_action"],
+        preflight_limit_rows=params["preflight_limit_rows"],
+        allow_delete=params["allow_delete"],
+        allow_ddl=params["allow_ddl"],
+        trace_file=params["trace_file"],
+        databases=dict(parse_database_spec(spec) for spec in params["databases"]),
+    )
 
 
 @click.command()
@@ -51,6 +100,189 @@ logging.basicConfig(
     default=False,
     help="(Default: `False`) Enable JSON responses instead of SSE streams. Only supported for `stream` transport.",
 )
+@click.option(
+    "--replica-tables",
+    default=None,
+    help="Comma-separated list of small, slowly changing tables (e.g. `users,skills,projects`) to snapshot into a local DuckDB replica. Reads that only touch these tables are served locally.",
+)
+@click.option(
+    "--replica-path",
+    default=":memory:",
+    help="(Default: `:memory:`) Path of the local DuckDB replica database",
+)
+@click.option(
+    "--replica-refresh-seconds",
+    type=float,
+    default=60.0,
+    help="(Default: `60`) Interval between replica refreshes, which is how long writes made outside this server can go unseen. Writes through this server always refresh the affected tables, and snapshots older than two intervals are not served.",
+)
+@click.option(
+    "--summarize-rows",
+    type=int,
+    default=None,
+    help="(Default: disabled) Row threshold above which a SELECT result is replaced by a compact in-engine profile (column statistics, top-k values and a sampled preview)",
+)
+@click.option(
+    "--summarize-bytes",
+    type=int,
+    default=None,
+    help="(Default: disabled) Size threshold, in bytes of rendered output, above which a SELECT result is replaced by a compact profile",
+)
+@click.option(
+    "--stateful",
+    is_flag=True,
+    default=False,
+    help="(Default: `False`) Keep MCP sessions stateful: each session owns a DuckDB cursor, so temp tables, `SET` options and prepared statements survive between calls. Only supported for `stream` transport.",
+)
+@click.option(
+    "--max-sessions",
+    type=int,
+    default=64,
+    help="(Default: `64`) Maximum number of stateful sessions (transport sessions and their DuckDB cursors); the least recently used idle one is ended beyond this",
+)
+@click.option(
+    "--session-ttl",
+    type=float,
+    default=900.0,
+    help="(Default: `900`) Seconds after which an idle stateful session is evicted",
+)
+@click.option(
+    "--max-concurrent-queries",
+    type=int,
+    default=None,
+    help="(Default: unlimited) Enable admission control: maximum number of tool calls running at once.",
+)
+@click.option(
+    "--max-queries-per-client",
+    type=int,
+    default=None,
+    help="(Default: same as `--max-concurrent-queries`) Maximum number of tool calls running at once for a single client",
+)
+@click.option(
+    "--max-queued-queries",
+    type=int,
+    default=64,
+    help="(Default: `64`) Maximum number of calls waiting for admission before new ones are rejected",
+)
+@click.option(
+    "--queue-timeout",
+    type=float,
+    default=30.0,
+    help="(Default: `30`) Seconds a call may wait for admission before it is rejected",
+)
+@click.option(
+    "--query-memory-limit",
+    default=None,
+    help="(Default: none) `memory_limit` applied to each query, e.g. `2GB`. Only applies to short lived read-only connections, since DuckDB scopes it to the whole instance.",
+)
+@click.option(
+    "--query-threads",
+    type=int,
+    default=None,
+    help="(Default: none) `threads` applied to each query. Only applies to short lived read-only connections, since DuckDB scopes it to the whole instance.",
+)
+@click.option(
+    "--threads",
+    type=int,
+    default=None,
+    help="(Default: derived from the cgroup CPU limit) Number of DuckDB threads",
+)
+@click.option(
+    "--memory-limit",
+    default=None,
+    help="(Default: 75% of the cgroup memory limit) Total DuckDB `memory_limit`, e.g. `4GB`, split evenly across the configured databases",
+)
+@click.option(
+    "--temp-directory",
+    default=None,
+    help="(Default: `<tmp>`) Directory where DuckDB spills to disk when over `memory_limit`. Each database spills into its own subdirectory, removed at exit.",
+)
+@click.option(
+    "--object-cache/--no-object-cache",
+    default=None,
+    help="(Default: enabled) Toggle DuckDB `enable_object_cache` (caches Parquet metadata between queries)",
+)
+@click.option(
+    "--log-format",
+    type=click.Choice(["text", "json"]),
+    default="text",
+    help="(Default: `text`) Log format. `json` writes one structured record per line, including per-call timing and row counts.",
+)
+@click.option(
+    "--log-sql-max-chars",
+    type=int,
+    default=200,
+    help="(Default: `200`) Maximum length of SQL text and other string arguments in tool call logs",
+)
+@click.option(
+    "--log-list-sample-rate",
+    type=float,
+    default=1.0,
+    help="(Default: `1.0`) Fraction of `list_tools`/`list_prompts` calls that are logged",
+)
+@click.option(
+    "--export-dir",
+    default=None,
+    help="(Default: disabled) Server-side directory where the `export_query` tool writes Parquet/CSV files. The tool is only offered when this is set.",
+)
+@click.option(
+    "--preflight-max-rows",
+    type=int,
+    default=None,
+    help="(Default: disabled) Enable the pre-flight guard: statements are checked against the write policy and `EXPLAIN`ed, and those whose estimated join output or result size exceeds this are rejected or limited",
+)
+@click.option(
+    "--preflight-action",
+    type=click.Choice(["reject", "limit"]),
+    default="reject",
+    help="(Default: `reject`) What to do with a query over the pre-flight limit. `limit` downgrades a single SELECT to `--preflight-limit-rows` rows; anything else is rejected.",
+)
+@click.option(
+    "--preflight-limit-rows",
+    type=int,
+    default=1000,
+    help="(Default: `1000`) Rows returned by a SELECT downgraded by the pre-flight guard",
+)
+@click.option(
+    "--allow-delete",
+    is_flag=True,
+    default=False,
+    help="Allow DELETE statements when the pre-flight guard is enabled",
+)
+@click.option(
+    "--allow-ddl",
+    is_flag=True,
+    default=False,
+    help="Allow destructive DDL (DROP, ALTER, CREATE OR REPLACE) when the pre-flight guard is enabled",
+)
+@click.option(
+    "--trace-file",
+    default=None,
+    help="(Default: disabled) Append a JSONL record of every tool call (tool, arguments, timing, result size) to this file, for `mcp-server-motherduck-replay`",
+)
+@click.option(
+    "--database",
+    "databases",
+    multiple=True,
+    help="Additional named database as `name=path[,read_only][,saas_mode]`, selectable with the `database` argument of the `query` tool and connected on first use (repeatable)",
+)
+@click.option(
+    "--http-compression/--no-http-compression",
+    default=True,
+    help="(Default: enabled) Compress HTTP responses of the `sse` and `stream` transports with gzip, or zstd when `zstandard` is installed, as negotiated with the client",
+)
+@click.option(
+    "--compression-min-size",
+    type=int,
+    default=1024,
+    help="(Default: `1024`) Complete HTTP responses smaller than this many bytes are sent uncompressed",
+)
+@click.option(
+    "--compression-level",
+    type=int,
+    default=6,
+    help="(Default: `6`) gzip/zstd compression level",
+)
 def main(
     port,
     transport,
@@ -60,18 +292,69 @@ def main(
     saas_mode,
     read_only,
     json_response,
+    replica_tables,
+    replica_path,
+    replica_refresh_seconds,
+    summarize_rows,
+    summarize_bytes,
+    stateful,
+    max_sessions,
+    session_ttl,
+    max_concurrent_queries,
+    max_queries_per_client,
+    max_queued_queries,
+    queue_timeout,
+    query_memory_limit,
+    query_threads,
+    threads,
+    memory_limit,
+    temp_directory,
+    object_cache,
+    log_format,
+    log_sql_max_chars,
+    log_list_sample_rate,
+    export_dir,
+    preflight_max_rows,
+    preflight_action,
+    preflight_limit_rows,
+    allow_delete,
+    allow_ddl,
+    trace_file,
+    databases,
+    http_compression,
+    compression_min_size,
+    compression_level,
 ):
     """Main entry point for the package."""
 
+    configure_logging(json_format=log_format == "json")
+
     logger.info("🦆 MotherDuck MCP Server v" + SERVER_VERSION)
     logger.info("Ready to execute SQL queries via DuckDB/MotherDuck")
 
+    compression_stats = (
+        CompressionStats() if http_compression and transport != "stdio" else None
+    )
+    middleware = []
+    if compression_stats is not None:
+        middleware.append(
+            Middleware(
+                CompressionMiddleware,
+                minimum_size=compression_min_size,
+                level=compression_level,
+                stats=compression_stats,
+            )
+        )
+
+    # Filled by `build_application` with callbacks releasing a session's resources
+    session_close_listeners = []
+
     app, init_opts = build_application(
-        db_path=db_path,
-        motherduck_token=motherduck_token,
-        home_dir=home_dir,
-        saas_mode=saas_mode,
-        read_only=read_only,
+        **server_options(click.get_current_context().params),
+        stats_sources={"http_compression": compression_stats.stats}
+        if compression_stats is not None
+        else None,
+        session_close_listeners=session_close_listeners,
     )
 
     if transport == "sse":
@@ -101,6 +384,7 @@ def main(
                 Route("/sse", endpoint=handle_sse, methods=["GET"]),
                 Mount("/messages/", app=sse.handle_post_message),
             ],
+            middleware=middleware,
         )
 
         import uvicorn
@@ -122,13 +406,23 @@ def main(
 
         logger.info("MCP server initialized in \033[32mhttp-streamable\033[0m mode")
 
-        # Create the session manager with true stateless mode
-        session_manager = StreamableHTTPSessionManager(
-            app=app,
-            event_store=None,
-            json_response=json_response,
-            stateless=True,
-        )
+        # Create the session manager, stateless unless `--stateful` is set
+        if stateful:
+            session_manager = BoundedSessionManager(
+                app=app,
+                max_sessions=max_sessions,
+                idle_ttl=session_ttl,
+                on_close=session_close_listeners,
+                event_store=None,
+                json_response=json_response,
+            )
+        else:
+            session_manager = StreamableHTTPSessionManager(
+                app=app,
+                event_store=None,
+                json_response=json_response,
+                stateless=True,
+            )
 
         async def handle_streamable_http(
             scope: Scope, receive: Receive, send: Send
@@ -157,6 +451,7 @@ def main(
             routes=[
                 Mount("/mcp", app=handle_streamable_http),
             ],
+            middleware=middleware,
             lifespan=lifespan,
         )
 
@@ -0,0 +1,150 @@
+import heapq
+import itertools
+import logging
+import time
+from collections import defaultdict
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+import anyio
+
+logger = logging.getLogger("mcp_server_motherduck")
+
+PRIORITIES = {"interactive": 0, "batch": 1}
+
+
+class AdmissionController:
+    """
+    Admission control in front of tool calls.
+
+    At most `max_concurrent` calls run at once, and at most `max_per_client`
+    for any single client. Waiting calls are granted in priority order
+    (interactive before batch, then FIFO), skipping clients that are already at
+    their own limit. Calls are rejected when the queue is full or when they wait
+    longer than `queue_timeout` seconds.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int,
+        max_per_client: int | None = None,
+        max_queue: int = 64,
+        queue_timeout: float = 30.0,
+    ):
+        self._max_concurrent = max_concurrent
+        self._max_per_client = max_per_client or max_concurrent
+        self._max_queue = max_queue
+        self._queue_timeout = queue_timeout
+        self._running = 0
+        self._running_per_client: defaultdict[str, int] = defaultdict(int)
+        # (priority, sequence, client id, event)
+        self._waiting: list[tuple[int, int, str, anyio.Event]] = []
+        self._sequence = itertools.count()
+
+        self._admitted = 0
+        self._rejected = 0
+        self._queued = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def _can_run(self, client_id: str) -> bool:
+        return (
+            self._running < self._max_concurrent
+            and self._running_per_client[client_id] < self._max_per_client
+        )
+
+    def _start(self, client_id: str) -> None:
+        self._running += 1
+        self._running_per_client[client_id] += 1
+
+    def _release(self, client_id: str) -> None:
+        self._running -= 1
+        self._running_per_client[client_id] -= 1
+        if self._running_per_client[client_id] == 0:
+            del self._running_per_client[client_id]
+        self._grant_waiting()
+
+    def _grant_waiting(self) -> None:
+        """Wake the highest priority waiters that are now allowed to run"""
+        skipped = []
+        while self._waiting and self._running < self._max_concurrent:
+            entry = heapq.heappop(self._waiting)
+            if self._can_run(entry[2]):
+                self._start(entry[2])
+                entry[3].set()
+            else:
+                skipped.append(entry)
+        for entry in skipped:
+            heapq.heappush(self._waiting, entry)
+
+    def _reject(self, client_id: str, reason: str) -> None:
+        self._rejected += 1
+        logger.warning(f"Rejected call from client {client_id}: {reason}")
+        raise ValueError(f"Server busy: {reason}, retry later")
+
+    @asynccontextmanager
+    async def admit(
+        self, client_id: str, priority: str = "interactive"
+    ) -> AsyncIterator[None]:
+        """Hold an execution slot for the duration of the block"""
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+
+        start = time.monotonic()
+        if not self._waiting and self._can_run(client_id):
+            self._start(client_id)
+        else:
+            if len(self._waiting) >= self._max_queue:
+                self._reject(client_id, f"queue is full ({self._max_queue} waiting)")
+
+            event = anyio.Event()
+            entry = (PRIORITIES[priority], next(self._sequence), client_id, event)
+            heapq.heappush(self._waiting, entry)
+            self._queued += 1
+            # Other waiters may be blocked only by their own per-client limit
+            self._grant_waiting()
+
+            try:
+                with anyio.move_on_after(self._queue_timeout):
+                    await event.wait()
+            except BaseException:
+                # Cancelled while queued: give back the slot if it was granted meanwhile
+                if event.is_set():
+                    self._release(client_id)
+                else:
+                    self._waiting.remove(entry)
+                    heapq.heapify(self._waiting)
+                raise
+
+            if not event.is_set():
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                self._reject(
+                    client_id, f"waited more than {self._queue_timeout}s in queue"
+                )
+
+        wait = time.monotonic() - start
+        self._admitted += 1
+        self._total_wait += wait
+        self._max_wait = max(self._max_wait, wait)
+        if wait > 0.1:
+            logger.info(
+                f"Admitted {priority} call from client {client_id} after {wait:.2f}s in queue"
+            )
+
+        try:
+            yield
+        finally:
+            self._release(client_id)
+
+    def stats(self) -> dict:
+        return {
+            "running": self._running,
+            "waiting": len(self._waiting),
+            "admitted": self._admitted,
+            "queued": self._queued,
+            "rejected": self._rejected,
+            "avg_wait_seconds": self._total_wait / self._admitted
+            if self._admitted
+            else 0.0,
+            "max_wait_seconds": self._max_wait,
+        }
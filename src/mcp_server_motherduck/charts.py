@@ -0,0 +1,316 @@
+import zlib
+import struct
+import datetime
+import numpy as np
+from .database import DatabaseClient
+
+MAX_CHART_ROWS = 200
+# a year of days, or about seven years of weeks
+MAX_CHART_COLUMNS = 366
+MAX_IMAGE_WIDTH = 1200
+GRANULARITY_DAYS = {"day": 1, "week": 7}
+
+BACKGROUND = (255, 255, 255)
+GRID = (90, 90, 90)
+NO_DATA = (235, 235, 235)
+OUT_OF_SPAN = (245, 140, 40)
+
+# utilization % -> color: idle grey, green, yellow at full allocation, red when overbooked
+UTILIZATION_STOPS = np.array([0.0, 50.0, 100.0, 150.0])
+UTILIZATION_COLORS = np.array(
+    [(225, 228, 232), (120, 200, 120), (250, 215, 70), (215, 40, 40)], dtype=float
+)
+
+# staffed FTE -> color inside a project's span
+FTE_STOPS = np.array([0.0, 1.0, 4.0])
+FTE_COLORS = np.array(
+    [(200, 220, 245), (90, 140, 210), (20, 50, 130)], dtype=float
+)
+
+
+def encode_png(image: np.ndarray) -> bytes:
+    """Encode an (height, width, 3) uint8 RGB array as a PNG"""
+    height, width, _ = image.shape
+    # each scanline is prefixed with filter type 0 (None)
+    raw = np.concatenate(
+        [np.zeros((height, 1), dtype=np.uint8), image.reshape(height, width * 3)],
+        axis=1,
+    ).tobytes()
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return (
+            struct.pack(">I", len(data))
+            + kind
+            + data
+            + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+        )
+
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw, 9))
+        + chunk(b"IEND", b"")
+    )
+
+
+def colorize(values: np.ndarray, stops: np.ndarray, colors: np.ndarray) -> np.ndarray:
+    """Map a 2D array to RGB by linear interpolation between color stops; NaN is `NO_DATA`"""
+    rgb = np.stack(
+        [np.interp(values, stops, colors[:, i]) for i in range(3)], axis=-1
+    )
+    rgb[np.isnan(values)] = NO_DATA
+    return rgb.astype(np.uint8)
+
+
+def rasterize(
+    cells: np.ndarray, column_marks: list[int], legend_bar: np.ndarray | None = None
+) -> np.ndarray:
+    """
+    Scale a (rows, columns, 3) grid of cell colors to pixels, with 1px gaps
+    between rows, vertical lines before `column_marks` and an optional color bar
+    underneath.
+    """
+    rows, columns, _ = cells.shape
+    cell_w = max(1, min(12, 900 // max(columns, 1)))
+    cell_h = max(3, min(16, 600 // max(rows, 1)))
+    if columns * cell_w > MAX_IMAGE_WIDTH:
+        raise ValueError(
+            f"Chart too wide: {columns} columns, at most {MAX_IMAGE_WIDTH} are supported"
+        )
+
+    image = np.repeat(np.repeat(cells, cell_w, axis=1), cell_h, axis=0)
+    # blank separator row after each row of cells
+    image = image.reshape(rows, cell_h, columns * cell_w, 3)
+    image = np.concatenate(
+        [image, np.full((rows, 1, columns * cell_w, 3), BACKGROUND, dtype=np.uint8)],
+        axis=1,
+    ).reshape(rows * (cell_h + 1), columns * cell_w, 3)
+
+    for column in column_marks:
+        image[:, column * cell_w] = GRID
+
+    if legend_bar is not None:
+        bar = np.repeat(
+            legend_bar[np.linspace(0, len(legend_bar) - 1, image.shape[1]).astype(int)][None],
+            8,
+            axis=0,
+        )
+        gap = np.full((4, image.shape[1], 3), BACKGROUND, dtype=np.uint8)
+        image = np.concatenate([image, gap, bar], axis=0)
+
+    # white margin around the chart
+    return np.pad(image, ((4, 4), (4, 4), (0, 0)), constant_values=255)
+
+
+class UtilizationChart:
+    """
+    Render staffing charts as PNG images.
+
+    Data is aggregated inside DuckDB down to one value per chart cell, then
+    rasterized with numpy, so a chart costs one image instead of thousands of
+    `v_user_daily_utilization` rows in the model context.
+    """
+
+    def __init__(self, db_client: DatabaseClient):
+        self._db = db_client
+
+    def _bounds(
+        self, start_date: str | None, end_date: str | None, session_id: str | None
+    ) -> tuple[datetime.date, datetime.date]:
+        _, rows = self._db.fetch(
+            "SELECT coalesce(?::DATE, min(day)), coalesce(?::DATE, max(day)) FROM v_days_rolling_180",
+            [start_date, end_date],
+            session_id=session_id,
+        )
+        lo, hi = rows[0]
+        if lo is None or hi is None or hi < lo:
+            raise ValueError(f"Invalid date range: {lo} - {hi}")
+        return lo, hi
+
+    @staticmethod
+    def _month_marks(lo: datetime.date, bucket_days: int, columns: int) -> list[int]:
+        """Column index of each first day of the month in the range"""
+        marks = []
+        for column in range(1, columns):
+            first = lo + datetime.timedelta(days=column * bucket_days)
+            previous = first - datetime.timedelta(days=bucket_days)
+            if first.month != previous.month:
+                marks.append(column)
+        return marks
+
+    def heatmap(
+        self,
+        lo: datetime.date,
+        hi: datetime.date,
+        bucket_days: int,
+        session_id: str | None = None,
+    ) -> tuple[np.ndarray, list[str], int]:
+        _, rows = self._db.fetch(
+            f"""
+            WITH cells AS (
+                SELECT user_id,
+                       date_diff('day', ?::DATE, day) // {bucket_days} AS bucket,
+                       avg(utilization_pct) AS utilization_pct
+                FROM v_user_daily_utilization
+                WHERE day BETWEEN ? AND ?
+                GROUP BY ALL
+            ),
+            ranked AS (
+                SELECT *, dense_rank() OVER (ORDER BY user_id) - 1 AS row_index
+                FROM cells
+            )
+            SELECT r.row_index, r.bucket, r.utilization_pct,
+                   coalesce(u.full_name, 'user ' || r.user_id) AS label
+            FROM ranked r LEFT JOIN users u USING (user_id)
+            WHERE r.row_index < {MAX_CHART_ROWS}
+            ORDER BY r.row_index, r.bucket
+            """,
+            [lo, lo, hi],
+            session_id=session_id,
+        )
+        columns = (hi - lo).days // bucket_days + 1
+        if not rows:
+            raise ValueError(f"No utilization data between {lo} and {hi}")
+
+        data = np.array([(r[0], r[1], r[2]) for r in rows], dtype=float)
+        grid = np.full((int(data[:, 0].max()) + 1, columns), np.nan)
+        grid[data[:, 0].astype(int), data[:, 1].astype(int)] = data[:, 2]
+
+        labels = {int(r[0]): r[3] for r in rows}
+        with np.errstate(all="ignore"):
+            means = np.nanmean(grid, axis=1)
+            peaks = np.nanmax(grid, axis=1)
+        legend = [
+            f"{i + 1}. {labels[i]}: avg {means[i]:.0f}%, peak {peaks[i]:.0f}%"
+            for i in range(len(grid))
+        ]
+
+        image = rasterize(
+            colorize(grid, UTILIZATION_STOPS, UTILIZATION_COLORS),
+            self._month_marks(lo, bucket_days, columns),
+            colorize(
+                np.linspace(0, UTILIZATION_STOPS[-1], 256)[None],
+                UTILIZATION_STOPS,
+                UTILIZATION_COLORS,
+            )[0],
+        )
+        return image, legend, len(grid)
+
+    def gantt(
+        self,
+        lo: datetime.date,
+        hi: datetime.date,
+        bucket_days: int,
+        session_id: str | None = None,
+    ) -> tuple[np.ndarray, list[str], int]:
+        _, projects = self._db.fetch(
+            f"""
+            SELECT project_id, code, name,
+                   date_diff('day', ?::DATE, greatest(start_date, ?::DATE)) // {bucket_days},
+                   date_diff('day', ?::DATE, least(end_date, ?::DATE)) // {bucket_days}
+            FROM projects
+            WHERE start_date <= ? AND coalesce(end_date, ?::DATE) >= ?
+            ORDER BY start_date, code
+            LIMIT {MAX_CHART_ROWS}
+            """,
+            [lo, lo, lo, hi, hi, hi, lo],
+            session_id=session_id,
+        )
+        if not projects:
+            raise ValueError(f"No projects active between {lo} and {hi}")
+
+        _, load = self._db.fetch(
+            f"""
+            SELECT a.project_id,
+                   date_diff('day', ?::DATE, d.day::DATE) // {bucket_days} AS bucket,
+                   sum(a.allocation_percent) / 100.0 / {bucket_days} AS fte
+            FROM assignments a
+            JOIN generate_series(?::DATE, ?::DATE, INTERVAL 1 DAY) d(day)
+              ON d.day::DATE BETWEEN a.start_date AND a.end_date
+            GROUP BY ALL
+            """,
+            [lo, lo, hi],
+            session_id=session_id,
+        )
+
+        columns = (hi - lo).days // bucket_days + 1
+        row_of = {p[0]: i for i, p in enumerate(projects)}
+        starts = np.array([p[3] for p in projects])[:, None]
+        ends = np.array(
+            [p[4] if p[4] is not None else columns - 1 for p in projects]
+        )[:, None]
+        in_span = (np.arange(columns) >= starts) & (np.arange(columns) <= ends)
+
+        fte = np.zeros((len(projects), columns))
+        staffed = [(row_of[r[0]], r[1], r[2]) for r in load if r[0] in row_of]
+        if staffed:
+            cells = np.array(staffed, dtype=float)
+            fte[cells[:, 0].astype(int), cells[:, 1].astype(int)] = cells[:, 2]
+
+        rgb = colorize(fte, FTE_STOPS, FTE_COLORS)
+        rgb[~in_span] = BACKGROUND
+        rgb[~in_span & (fte > 0)] = OUT_OF_SPAN
+
+        legend = []
+        for i, p in enumerate(projects):
+            span = fte[i][in_span[i]]
+            legend.append(
+                f"{i + 1}. {p[1]} {p[2]}: avg {span.mean() if span.size else 0:.1f} FTE, "
+                f"peak {fte[i].max():.1f} FTE"
+            )
+
+        image = rasterize(
+            rgb,
+            self._month_marks(lo, bucket_days, columns),
+            colorize(np.linspace(0, FTE_STOPS[-1], 256)[None], FTE_STOPS, FTE_COLORS)[0],
+        )
+        return image, legend, len(projects)
+
+    def render(
+        self,
+        chart: str = "heatmap",
+        start_date: str | None = None,
+        end_date: str | None = None,
+        granularity: str = "day",
+        session_id: str | None = None,
+    ) -> tuple[bytes, str, int]:
+        """Return the PNG, a text legend and the number of chart rows"""
+        if granularity not in GRANULARITY_DAYS:
+            raise ValueError(f"Unsupported granularity: {granularity}")
+        if chart not in ("heatmap", "gantt"):
+            raise ValueError(f"Unsupported chart: {chart}")
+
+        bucket_days = GRANULARITY_DAYS[granularity]
+        lo, hi = self._bounds(start_date, end_date, session_id)
+
+        # long ranges switch to weekly columns, and are rejected beyond that
+        days = (hi - lo).days + 1
+        note = ""
+        if granularity == "day" and days > MAX_CHART_COLUMNS:
+            granularity, bucket_days = "week", GRANULARITY_DAYS["week"]
+            note = f" The range spans more than {MAX_CHART_COLUMNS} days, so columns are weeks."
+        if (days - 1) // bucket_days + 1 > MAX_CHART_COLUMNS:
+            raise ValueError(
+                f"Date range {lo} - {hi} is too long: at most {MAX_CHART_COLUMNS} "
+                f"{granularity}s can be charted, narrow `start_date`/`end_date`"
+            )
+        if chart == "heatmap":
+            image, rows, row_count = self.heatmap(lo, hi, bucket_days, session_id)
+            header = (
+                f"Utilization heatmap {lo} - {hi}, one row per user and one column per {granularity}. "
+                "Colors: grey 0%, green 50%, yellow 100%, red 150%+; light grey = no data. "
+                "Vertical lines mark the start of each month; the bar at the bottom is the color scale."
+            )
+        else:
+            image, rows, row_count = self.gantt(lo, hi, bucket_days, session_id)
+            header = (
+                f"Project Gantt chart {lo} - {hi}, one row per project (by start date) and one column per {granularity}. "
+                "Bars span the project dates, shaded from light (unstaffed) to dark blue (4+ FTE staffed); "
+                "orange = staffed outside the project dates. "
+                "Vertical lines mark the start of each month; the bar at the bottom is the color scale."
+            )
+
+        header += note
+        if row_count == MAX_CHART_ROWS:
+            header += f" Only the first {MAX_CHART_ROWS} rows are shown."
+        return encode_png(image), header + "\n\n" + "\n".join(rows), row_count
@@ -1,14 +1,55 @@
 import os
+import functools
+import threading
 import duckdb
-from typing import Literal, Optional
+from typing import Any, Literal, Optional
 import io
-from contextlib import redirect_stdout
+from contextlib import contextmanager, redirect_stdout
+from collections.abc import Iterator
 from tabulate import tabulate
 import logging
 from .configs import SERVER_VERSION
+from .replica import LocalReplica
+from .summary import estimated_render_bytes, materialized, summarize_table
+from .sessions import SessionCursorPool
+from .singleflight import SingleFlight
+from .preflight import PreflightGuard, statement_text
 
 logger = logging.getLogger("mcp_server_motherduck")
 
+# Module-level duckdb functions share the default connection, which is not thread-safe
+_parser_lock = threading.Lock()
+
+
+def _extract_statements(query: str) -> list[duckdb.Statement]:
+    with _parser_lock:
+        return duckdb.extract_statements(query)
+
+
+def is_read_query(query: str) -> bool:
+    """Whether every statement in the query is a plain SELECT"""
+    try:
+        statements = _extract_statements(query)
+    except Exception:
+        return False
+    return bool(statements) and all(
+        s.type == duckdb.StatementType.SELECT for s in statements
+    )
+
+
+def is_single_read_query(query: str) -> bool:
+    """Whether the query is exactly one plain SELECT statement"""
+    try:
+        statements = _extract_statements(query)
+    except Exception:
+        return False
+    return len(statements) == 1 and statements[0].type == duckdb.StatementType.SELECT
+
+
+def first_statement(query: str) -> str:
+    """Text of the query's first statement, without its trailing semicolon"""
+    return statement_text(_extract_statements(query)[0].query)
+
 
 class DatabaseClient:
     def __init__(
@@ -18,8 +59,28 @@ class DatabaseClient:
         home_dir: str | None = None,
         saas_mode: bool = False,
         read_only: bool = False,
+        replica_tables: list[str] | None = None,
+        replica_path: str = ":memory:",
+        replica_refresh_seconds: float = 60.0,
+        summarize_rows: int | None = None,
+        summarize_bytes: int | None = None,
+        summarize_top_k: int = 5,
+        summarize_sample_rows: int = 10,
+        stateful_sessions: bool = False,
+        max_sessions: int = 64,
+        query_settings: dict[str, str] | None = None,
+        settings: dict[str, Any] | None = None,
+        preflight: PreflightGuard | None = None,
     ):
         self._read_only = read_only
+        self._settings = settings or {}
+        self.singleflight = SingleFlight()
+        self.preflight = preflight
+        self._summarize_rows = summarize_rows
+        self._summarize_bytes = summarize_bytes
+        self._summarize_top_k = summarize_top_k
+        self._summarize_sample_rows = summarize_sample_rows
+        self._query_settings = query_settings or {}
         self.db_path, self.db_type = self._resolve_db_path_type(
             db_path, motherduck_token, saas_mode
         )
@@ -30,6 +91,40 @@ class DatabaseClient:
             os.environ["HOME"] = home_dir
 
         self.conn = self._initialize_connection()
+        # calls without a session share the persistent connection (and its temp
+        # tables and settings), one worker thread at a time
+        self._conn_lock = threading.RLock()
+
+        if self._query_settings and self.conn is not None:
+            # `memory_limit` and `threads` are instance-wide in DuckDB, so they can
+            # only be scoped to a single query on short lived connections
+            logger.warning(
+                "Per-query settings are only applied to short lived read-only connections, "
+                f"ignoring {', '.join(self._query_settings)} on the shared connection"
+            )
+
+        self.replica = None
+        if replica_tables:
+            if self.conn is None:
+                logger.warning(
+                    "Local replica requires a persistent connection, ignoring `--replica-tables`"
+                )
+            else:
+                self.replica = LocalReplica(
+                    self.conn,
+                    replica_tables,
+                    path=replica_path,
+                    refresh_seconds=replica_refresh_seconds,
+                )
+
+        self.sessions = None
+        if stateful_sessions:
+            if self.conn is None:
+                logger.warning(
+                    "Stateful sessions require a persistent connection, falling back to shared state"
+                )
+            else:
+                self.sessions = SessionCursorPool(self.conn, max_sessions=max_sessions)
 
     def _initialize_connection(self) -> Optional[duckdb.DuckDBPyConnection]:
         """Initialize connection to the MotherDuck or DuckDB database"""
@@ -39,13 +134,7 @@ class DatabaseClient:
         if self.db_type == "duckdb" and self._read_only:
             # check that we can connect, issue a `select 1` and then close + return None
             try:
-                conn = duckdb.connect(
-                    self.db_path,
-                    config={
-                        "custom_user_agent": f"mcp-server-motherduck/{SERVER_VERSION}"
-                    },
-                    read_only=self._read_only,
-                )
+                conn = self._connect()
                 conn.execute("SELECT 1")
                 conn.close()
                 return None
@@ -53,16 +142,23 @@ class DatabaseClient:
                 logger.error(f"❌ Read-only check failed: {e}")
                 raise
 
-        conn = duckdb.connect(
-            self.db_path,
-            config={"custom_user_agent": f"mcp-server-motherduck/{SERVER_VERSION}"},
-            read_only=self._read_only,
-        )
+        conn = self._connect()
 
         logger.info(f"✅ Successfully connected to {self.db_type} database")
 
         return conn
 
+    def _connect(self) -> duckdb.DuckDBPyConnection:
+        """Open a new connection to the configured database"""
+        return duckdb.connect(
+            self.db_path,
+            config={
+                **self._settings,
+                "custom_user_agent": f"mcp-server-motherduck/{SERVER_VERSION}",
+            },
+            read_only=self._read_only,
+        )
+
     def _resolve_db_path_type(
         self, db_path: str, motherduck_token: str | None = None, saas_mode: bool = False
     ) -> tuple[str, Literal["duckdb", "motherduck"]]:
@@ -100,32 +196,183 @@ class DatabaseClient:
 
         return db_path, "duckdb"
 
-    def _execute(self, query: str) -> str:
-        if self.conn is None:
-            # open short lived readonly connection, run query, close connection, return result
-            conn = duckdb.connect(
-                self.db_path,
-                config={"custom_user_agent": f"mcp-server-motherduck/{SERVER_VERSION}"},
-                read_only=self._read_only,
-            )
-            q = conn.execute(query)
-        else:
-            q = self.conn.execute(query)
+    @contextmanager
+    def _connection(
+        self, session_id: str | None = None
+    ) -> Iterator[duckdb.DuckDBPyConnection]:
+        """Yield the session's cursor, the persistent connection, or a short lived one in read-only mode"""
+        if self.sessions is not None and session_id is not None:
+            with self.sessions.acquire(session_id) as cursor:
+                yield cursor
+            return
 
+        if self.conn is not None:
+            with self._conn_lock:
+                yield self.conn
+            return
+
+        # open short lived readonly connection, run query, close connection
+        conn = self._connect()
+        try:
+            for name, value in self._query_settings.items():
+                conn.execute(f"SET {name} = '{value}'")
+            yield conn
+        finally:
+            conn.close()
+
+    def _run(
+        self,
+        query: str,
+        parameters: list | None = None,
+        session_id: str | None = None,
+        notify_write: bool = True,
+    ) -> tuple[list, list]:
+        """
+        Run a query and return its description and fetched rows.
+        With `notify_write`, statements other than SELECT mark the replica stale.
+        """
+        read = self.replica is not None and is_read_query(query)
+        if read and self.replica.can_serve(query):
+            return self.replica.run(query, parameters)
+
+        with self._connection(session_id) as conn:
+            q = conn.execute(query, parameters)
+            rows = q.fetchall()
+            description = q.description
+
+        if self.replica is not None and not read and notify_write:
+            self.replica.notify_write(query)
+
+        return description, rows
+
+    @contextmanager
+    def _read_connection(
+        self, query: str, session_id: str | None = None
+    ) -> Iterator[duckdb.DuckDBPyConnection]:
+        """Like `_connection`, but on the replica when it can serve the query"""
+        if self.replica is not None and self.replica.can_serve(query):
+            with self.replica.cursor() as cursor:
+                yield cursor
+            return
+        with self._connection(session_id) as conn:
+            yield conn
+
+    def _render_table(
+        self, conn: duckdb.DuckDBPyConnection, table: str, names: list[str]
+    ) -> tuple[str, int]:
+        q = conn.execute(f"SELECT * FROM {table}")
+        rows = q.fetchall()
+        out = tabulate(rows, headers=self._headers(q.description, names), tablefmt="pretty")
+        return out, len(rows)
+
+    @staticmethod
+    def _headers(description: list, names: list[str]) -> list[str]:
+        return [name + "\n" + d[1] for name, d in zip(names, description)]
+
+    def _render_or_summarize(
+        self, query: str, session_id: str | None = None
+    ) -> tuple[str, int]:
+        """
+        Run a single SELECT once into a temp table, then render it, or profile it
+        when it exceeds the row or byte threshold, without running the query again.
+        The byte threshold is first checked against an in-engine estimate, so
+        huge results are never fetched and tabulated just to be discarded.
+        """
+        with self._read_connection(query, session_id) as conn:
+            with materialized(conn, query) as (table, names):
+                summarize = functools.partial(
+                    summarize_table,
+                    conn,
+                    table,
+                    top_k=self._summarize_top_k,
+                    sample_rows=self._summarize_sample_rows,
+                )
+                if self._summarize_rows is not None:
+                    row_count = conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+                    if row_count > self._summarize_rows:
+                        return summarize()
+
+                if self._summarize_bytes is not None:
+                    description = conn.execute(f"SELECT * FROM {table} LIMIT 0").description
+                    estimate = estimated_render_bytes(
+                        conn, table, self._headers(description, names)
+                    )
+                    if estimate > self._summarize_bytes:
+                        return summarize()
+
+                out, row_count = self._render_table(conn, table, names)
+                if (
+                    self._summarize_bytes is not None
+                    and len(out.encode()) > self._summarize_bytes
+                ):
+                    return summarize()
+                return out, row_count
+
+    def check_preflight(self, query: str, session_id: str | None = None) -> None:
+        """Raise ValueError if the pre-flight guard (when enabled) rejects the joins of a query"""
+        if self.preflight is None:
+            return
+        with self._connection(session_id) as conn:
+            self.preflight.check(conn, query, action="reject", judge_output=False)
+
+    def _execute(
+        self, query: str, session_id: str | None = None
+    ) -> tuple[str, int]:
+        """Run a query and render it, returning the output and the result's row count"""
+        if self.preflight is None:
+            return self._render(query, session_id)
+
+        with self._connection(session_id) as conn:
+            query, notice = self.preflight.check(conn, query)
+        out, row_count = self._render(query, session_id)
+        if notice is not None:
+            out = notice + "\n\n" + out
+        return out, row_count
+
+    def _render(
+        self, query: str, session_id: str | None = None
+    ) -> tuple[str, int]:
+        if (
+            self._summarize_rows is not None or self._summarize_bytes is not None
+        ) and is_single_read_query(query):
+            return self._render_or_summarize(query, session_id)
+
+        description, rows = self._run(query, session_id=session_id)
         out = tabulate(
-            q.fetchall(),
-            headers=[d[0] + "\n" + d[1] for d in q.description],
+            rows,
+            headers=[d[0] + "\n" + d[1] for d in description],
             tablefmt="pretty",
         )
+        return out, len(rows)
 
-        if self.conn is None:
-            conn.close()
-
-        return out
+    def fetch(
+        self,
+        query: str,
+        parameters: list | None = None,
+        session_id: str | None = None,
+        notify_write: bool = True,
+    ) -> tuple[list[str], list]:
+        """Run a query and return column names and raw rows, without rendering"""
+        description, rows = self._run(
+            query, parameters, session_id=session_id, notify_write=notify_write
+        )
+        return [d[0] for d in description], rows
 
-    def query(self, query: str) -> str:
+    def run_query(
+        self, query: str, session_id: str | None = None
+    ) -> tuple[str, int]:
+        """Like `query`, also returning the number of rows in the result"""
         try:
-            return self._execute(query)
+            if is_read_query(query):
+                # identical reads already in flight share one execution and rendering
+                return self.singleflight.do(
+                    (session_id, query.strip()),
+                    lambda: self._execute(query, session_id),
+                )
+            return self._execute(query, session_id)
 
         except Exception as e:
             raise ValueError(f"❌ Error executing query: {e}")
+
+    def query(self, query: str, session_id: str | None = None) -> str:
+        return self.run_query(query, session_id)[0]
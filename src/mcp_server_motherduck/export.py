@@ -0,0 +1,92 @@
+import os
+import time
+import logging
+from tabulate import tabulate
+from .database import DatabaseClient, first_statement, is_single_read_query
+
+logger = logging.getLogger("mcp_server_motherduck")
+
+EXPORT_FORMATS = {
+    "parquet": "FORMAT parquet, COMPRESSION zstd",
+    "csv": "FORMAT csv, HEADER",
+}
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _size_on_disk(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(
+        os.path.getsize(os.path.join(root, f))
+        for root, _, files in os.walk(path)
+        for f in files
+    )
+
+
+class QueryExporter:
+    """
+    Write query results straight to server-side files with `COPY (query) TO`.
+
+    Rows never pass through Python: only the path, row count, size on disk and
+    duration are returned. Target paths are resolved inside `export_dir`.
+    """
+
+    def __init__(self, db_client: DatabaseClient, export_dir: str):
+        self._db = db_client
+        self._export_dir = os.path.realpath(export_dir)
+        os.makedirs(self._export_dir, exist_ok=True)
+        logger.info(f"Query exports enabled into `{self._export_dir}`")
+
+    def _resolve(self, path: str) -> str:
+        target = os.path.realpath(os.path.join(self._export_dir, path))
+        if os.path.commonpath([target, self._export_dir]) != self._export_dir:
+            raise ValueError(f"Export path must be inside the export directory: {path}")
+        return target
+
+    def export(
+        self,
+        query: str,
+        path: str,
+        format: str = "parquet",
+        partition_by: list[str] | None = None,
+        session_id: str | None = None,
+    ) -> str:
+        if format not in EXPORT_FORMATS:
+            raise ValueError(f"Unsupported export format: {format}")
+        if not is_single_read_query(query):
+            raise ValueError("Only a single SELECT statement can be exported")
+
+        # an accidental cartesian product would otherwise go straight to disk
+        self._db.check_preflight(query, session_id=session_id)
+
+        target = self._resolve(path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+
+        options = EXPORT_FORMATS[format]
+        if partition_by:
+            options += (
+                ", PARTITION_BY ("
+                + ", ".join(_quote(c) for c in partition_by)
+                + "), OVERWRITE"
+            )
+
+        statement = first_statement(query)
+        escaped_target = target.replace("'", "''")
+        start = time.monotonic()
+        # newline so that a trailing `--` comment cannot swallow the closing parenthesis.
+        # COPY ... TO only reads the database, so the replica stays valid.
+        _, rows = self._db.fetch(
+            f"COPY ({statement}\n) TO '{escaped_target}' ({options})",
+            session_id=session_id,
+            notify_write=False,
+        )
+        duration = time.monotonic() - start
+
+        return tabulate(
+            [(target, format, rows[0][0], _size_on_disk(target), round(duration, 3))],
+            headers=["path", "format", "rows", "bytes", "duration_s"],
+            tablefmt="pretty",
+        )
@@ -0,0 +1,214 @@
+import zlib
+import threading
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import zstandard
+except ImportError:  # optional, gzip only without it
+    zstandard = None
+
+COMPRESSIBLE_TYPES = ("text/", "application/json")
+
+
+def negotiate_encoding(accept_encoding: str) -> str | None:
+    """Pick `zstd` (when available) or `gzip` from an Accept-Encoding header"""
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip()] = q
+
+    wildcard = accepted.get("*", 0.0)
+    for coding in ("zstd", "gzip") if zstandard is not None else ("gzip",):
+        if accepted.get(coding, wildcard) > 0:
+            return coding
+    return None
+
+
+class _Compressor:
+    """Incremental gzip or zstd stream; `flush` emits everything compressed so far"""
+
+    def __init__(self, encoding: str, level: int):
+        if encoding == "zstd":
+            self._obj = zstandard.ZstdCompressor(level=min(level, 19)).compressobj()
+            self._sync = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        else:
+            self._obj = zlib.compressobj(level, zlib.DEFLATED, 31)
+            self._sync = zlib.Z_SYNC_FLUSH
+
+    def compress(self, data: bytes, flush: bool = False) -> bytes:
+        out = self._obj.compress(data)
+        return out + self._obj.flush(self._sync) if flush else out
+
+    def finish(self) -> bytes:
+        return self._obj.flush()
+
+
+class CompressionStats:
+    """Bytes before and after compression, per encoding"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._encodings: dict[str, dict[str, int]] = {}
+        self._uncompressed = 0
+
+    def _counters(self, encoding: str) -> dict[str, int]:
+        return self._encodings.setdefault(
+            encoding, {"responses": 0, "raw_bytes": 0, "sent_bytes": 0}
+        )
+
+    def record_response(self, encoding: str) -> None:
+        with self._lock:
+            self._counters(encoding)["responses"] += 1
+
+    def record_bytes(self, encoding: str, raw_bytes: int, sent_bytes: int) -> None:
+        # called per chunk, so long lived SSE streams are accounted for as they go
+        with self._lock:
+            counters = self._counters(encoding)
+            counters["raw_bytes"] += raw_bytes
+            counters["sent_bytes"] += sent_bytes
+
+    def record_uncompressed(self) -> None:
+        with self._lock:
+            self._uncompressed += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "uncompressed_responses": self._uncompressed,
+                **{
+                    encoding: {
+                        **counters,
+                        "ratio": round(counters["raw_bytes"] / counters["sent_bytes"], 2)
+                        if counters["sent_bytes"]
+                        else None,
+                    }
+                    for encoding, counters in self._encodings.items()
+                },
+            }
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing HTTP responses with the best encoding the client accepts.
+
+    Complete bodies smaller than `minimum_size` are sent as is. Streamed bodies
+    are compressed chunk by chunk, and Server-Sent Events are flushed after every
+    chunk so that each event reaches the client immediately.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        level: int = 6,
+        stats: CompressionStats | None = None,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+        self.stats = stats
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        await _CompressedResponse(self, encoding, send)(scope, receive)
+
+
+class _CompressedResponse:
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.send = send
+        self.start_message: Message | None = None
+        self.compressor: _Compressor | None = None
+        self.passthrough = False
+        self.streaming_events = False
+
+    async def __call__(self, scope: Scope, receive: Receive) -> None:
+        await self.middleware.app(scope, receive, self.on_send)
+
+    def _start_compressed(self) -> None:
+        headers = MutableHeaders(raw=list(self.start_message["headers"]))
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        del headers["Content-Length"]
+        self.start_message = {**self.start_message, "headers": headers.raw}
+        self.compressor = _Compressor(self.encoding, self.middleware.level)
+        if self.middleware.stats is not None:
+            self.middleware.stats.record_response(self.encoding)
+
+    async def _send_body(self, raw: bytes, data: bytes, more_body: bool) -> None:
+        if self.middleware.stats is not None:
+            self.middleware.stats.record_bytes(self.encoding, len(raw), len(data))
+        await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+    async def on_send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            headers = Headers(raw=message["headers"])
+            content_type = headers.get("content-type", "")
+            self.passthrough = "content-encoding" in headers or not content_type.startswith(
+                COMPRESSIBLE_TYPES
+            )
+            self.streaming_events = content_type.startswith("text/event-stream")
+            if self.streaming_events and not self.passthrough:
+                # SSE: headers go out now, before the first event
+                self._start_compressed()
+                await self.send(self.start_message)
+            return
+
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.passthrough:
+            if self.start_message is not None:
+                await self.send(self.start_message)
+                self.start_message = None
+                if self.middleware.stats is not None:
+                    self.middleware.stats.record_uncompressed()
+            await self.send(message)
+            return
+
+        if self.compressor is None:
+            if not more_body and len(body) < self.middleware.minimum_size:
+                self.passthrough = True
+                await self.on_send(message)
+                return
+
+            self._start_compressed()
+            if not more_body:
+                data = self.compressor.compress(body) + self.compressor.finish()
+                self.start_message["headers"].append(
+                    (b"content-length", str(len(data)).encode())
+                )
+                await self.send(self.start_message)
+                await self._send_body(body, data, False)
+                return
+            await self.send(self.start_message)
+
+        if more_body:
+            await self._send_body(
+                body, self.compressor.compress(body, flush=self.streaming_events), True
+            )
+        else:
+            await self._send_body(
+                body, self.compressor.compress(body) + self.compressor.finish(), False
+            )
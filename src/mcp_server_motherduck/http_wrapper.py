@@ -3,13 +3,19 @@ from starlette.applications import Starlette
 from starlette.responses import PlainTextResponse
 from starlette.requests import Request
 from starlette.routing import Mount
+from starlette.middleware import Middleware
 
 from mcp.server.sse import create_sse_app
 from .server import build_application
+from .http_compression import CompressionMiddleware, CompressionStats
+
+# Compressione gzip/zstd delle risposte, con i byte risparmiati nella risorsa stats
+compression_stats = CompressionStats()
 
 # Costruisci l'app SSE originale
 server, _ = build_application(
     db_path="md:",
+    stats_sources={"http_compression": compression_stats.stats},
 )
 sse_app = create_sse_app(server)
 
@@ -42,4 +48,7 @@ async def router(scope, receive, send):
     # Tutto il resto lo gestisce l'app SSE (GET /sse compreso)
     return await sse_app(scope, receive, send)
 
-app = Starlette(routes=[Mount("/", router)])
+app = Starlette(
+    routes=[Mount("/", router)],
+    middleware=[Middleware(CompressionMiddleware, stats=compression_stats)],
+)
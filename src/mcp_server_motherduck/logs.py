@@ -0,0 +1,80 @@
+import json
+import time
+import atexit
+import random
+import logging
+from queue import SimpleQueue
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_FORMAT = "[motherduck] %(levelname)s - %(message)s"
+
+_listener: QueueListener | None = None
+_stream_handler: logging.StreamHandler | None = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, including the structured `fields` passed via `extra`"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+            + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        payload.update(getattr(record, "fields", {}))
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+def configure_logging(json_format: bool = False) -> None:
+    """
+    Route all records through a queue so that callers never block on stderr.
+
+    The first call installs a `QueueHandler` on the root logger and starts a
+    `QueueListener` thread that does the actual writes. Later calls only switch
+    the output format.
+    """
+    global _listener, _stream_handler
+
+    if _listener is None:
+        queue = SimpleQueue()
+        _stream_handler = logging.StreamHandler()
+        _listener = QueueListener(queue, _stream_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+        # The queue handler merges args into the message; formatting happens in the listener
+        queue_handler = QueueHandler(queue)
+        queue_handler.setFormatter(logging.Formatter("%(message)s"))
+        logging.basicConfig(level=logging.INFO, handlers=[queue_handler])
+
+    _stream_handler.setFormatter(
+        JsonFormatter() if json_format else logging.Formatter(LOG_FORMAT)
+    )
+
+
+def truncate(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars] + f"… [{len(text) - max_chars} more chars]"
+
+
+def loggable_arguments(arguments: dict | None, max_chars: int) -> dict | None:
+    """Tool arguments with long string values (SQL bodies) truncated for logging"""
+    if arguments is None:
+        return None
+    return {
+        key: truncate(value, max_chars) if isinstance(value, str) else value
+        for key, value in arguments.items()
+    }
+
+
+class LogSampler:
+    """Let through roughly `rate` of the records for high-frequency events"""
+
+    def __init__(self, rate: float = 1.0):
+        self._rate = rate
+
+    def __call__(self) -> bool:
+        return self._rate >= 1.0 or random.random() < self._rate
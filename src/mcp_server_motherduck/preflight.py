@@ -0,0 +1,326 @@
+import json
+import logging
+from typing import Literal
+from collections.abc import Iterator
+import duckdb
+
+logger = logging.getLogger("mcp_server_motherduck")
+
+# DDL that can remove or rewrite existing objects; CREATE is only destructive with OR REPLACE
+DESTRUCTIVE_DDL_STATEMENTS = {
+    duckdb.StatementType.DROP,
+    duckdb.StatementType.ALTER,
+    duckdb.StatementType.COPY_DATABASE,
+}
+
+# Keyword followed by the target table of a write, e.g. INSERT ... INTO <table>
+WRITE_TARGET_KEYWORDS = {
+    duckdb.StatementType.INSERT: "INTO",
+    duckdb.StatementType.UPDATE: "UPDATE",
+}
+
+
+def _tokens(text: str) -> list[str]:
+    """Tokens of a statement, without comments"""
+    positions = [p for p, _ in duckdb.tokenize(text)]
+    return [
+        text[start:end].strip()
+        for start, end in zip(positions, positions[1:] + [len(text)])
+    ]
+
+
+def _unquote(name: str) -> str:
+    return name.replace('"', "").lower()
+
+
+def statement_text(text: str) -> str:
+    """Statement text without trailing semicolons, which may be followed by comments"""
+    positions = [p for p, _ in duckdb.tokenize(text)]
+    while positions and text[positions[-1]] == ";":
+        text = text[: positions.pop()]
+    return text.strip()
+
+
+def _top_level(tokens: list[str]) -> Iterator[tuple[int, str]]:
+    """Index and upper-cased text of the tokens outside parentheses"""
+    depth = 0
+    for i, token in enumerate(tokens):
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+        elif depth == 0:
+            yield i, token.upper()
+
+
+def _name_at(tokens: list[str], start: int) -> str | None:
+    """Unqualified, lower-cased name of the (possibly qualified) identifier at `start`"""
+    if start >= len(tokens):
+        return None
+    end = start + 1
+    while end + 1 < len(tokens) and tokens[end] == ".":
+        end += 2
+    return _unquote(tokens[end - 1])
+
+
+def _write_target(statement_type: duckdb.StatementType, tokens: list[str]) -> str | None:
+    """Table written by an INSERT or UPDATE"""
+    keyword = WRITE_TARGET_KEYWORDS[statement_type]
+    for i, token in _top_level(tokens):
+        if token == keyword:
+            return _name_at(tokens, i + 1)
+    return None
+
+
+def _copy_target(tokens: list[str]) -> str | None:
+    """Table loaded by `COPY <table> FROM`, or None for `COPY ... TO`"""
+    if len(tokens) < 2 or tokens[1] == "(":
+        return None
+    for _, token in _top_level(tokens[2:]):
+        if token == "TO":
+            return None
+        if token == "FROM":
+            return _name_at(tokens, 1)
+    return None
+
+
+# Operators that stop pulling rows from their input once the limit is reached
+STREAMING_LIMIT_OPERATORS = {"LIMIT", "STREAMING_LIMIT", "LIMIT_PERCENT"}
+
+
+def _estimated_cardinality(node: dict) -> tuple[int, int]:
+    """
+    Return the estimated output of a JSON physical plan node and the largest
+    estimated output of a join below it. Scans are not judged: reading a large
+    table is fine, multiplying it by another one is what the guard is for.
+
+    DuckDB does not annotate every node: CROSS_PRODUCT is taken as the product
+    of its inputs, UNION as their sum, an ungrouped aggregate as one row and
+    anything else as its largest input. TOP_N is capped at its `Top` value, and under
+    a streaming LIMIT the input is only read until the limit is reached, so
+    neither its output nor the joins below it count.
+    """
+    name = node.get("name", "").strip()
+    extra_info = node.get("extra_info", {})
+    children = [_estimated_cardinality(c) for c in node.get("children", [])]
+    joins = max((child_joins for _, child_joins in children), default=0)
+
+    if name in STREAMING_LIMIT_OPERATORS:
+        return 0, 0
+
+    estimate = str(extra_info.get("Estimated Cardinality", ""))
+    # some operators above an aggregate report 0, which means "unknown"
+    if estimate.isdigit() and int(estimate) > 0:
+        output = int(estimate)
+    elif name == "UNGROUPED_AGGREGATE":
+        output = 1
+    elif name == "CROSS_PRODUCT" and children:
+        output = 1
+        for child_output, _ in children:
+            output *= child_output
+    elif name == "UNION":
+        output = sum(child_output for child_output, _ in children)
+    else:
+        output = max((child_output for child_output, _ in children), default=0)
+
+    top = str(extra_info.get("Top", ""))
+    if name == "TOP_N" and top.isdigit():
+        output = min(output, int(top))
+
+    # SEMI/ANTI/MARK joins only filter their left input, so they can't blow up.
+    # A semi join on rowid is DuckDB fetching the remaining columns of the rows
+    # that survived e.g. a TOP_N, so its output is its smallest input.
+    if extra_info.get("Join Type") in ("SEMI", "ANTI", "MARK"):
+        if "rowid" in str(extra_info.get("Conditions", "")) and children:
+            output = min(child_output for child_output, _ in children)
+        return output, joins
+
+    if name == "CROSS_PRODUCT" or "JOIN" in name:
+        joins = max(joins, output)
+    return output, joins
+
+
+def _plan_estimate(plan: list[dict]) -> tuple[int, int]:
+    """Estimated result rows and largest estimated join output of a JSON physical plan"""
+    estimates = [_estimated_cardinality(node) for node in plan]
+    return (
+        max((output for output, _ in estimates), default=0),
+        max((joins for _, joins in estimates), default=0),
+    )
+
+
+class PreflightGuard:
+    """
+    Check each statement before it runs.
+
+    Statement types are classified against the write policy of the planner
+    prompt: DELETE and destructive DDL (DROP, ALTER, CREATE OR REPLACE of
+    persistent objects) are denied unless explicitly allowed, while CREATE and
+    dropping temp tables are fine. INSERT/UPDATE and `COPY ... FROM` are only
+    allowed on the writable tables. Statements are then `EXPLAIN`ed, and
+    those whose estimated join output or result size exceeds `max_estimated_rows` are rejected,
+    or, for a single SELECT with `action="limit"`, downgraded to `limit_rows` rows.
+    """
+
+    def __init__(
+        self,
+        max_estimated_rows: int,
+        action: Literal["reject", "limit"] = "reject",
+        limit_rows: int = 1000,
+        writable_tables: tuple[str, ...] | None = None,
+        allow_delete: bool = False,
+        allow_ddl: bool = False,
+    ):
+        self._max_estimated_rows = max_estimated_rows
+        self._action = action
+        self._limit_rows = limit_rows
+        self._writable_tables = (
+            {t.lower() for t in writable_tables} if writable_tables is not None else None
+        )
+        self._allow_delete = allow_delete
+        self._allow_ddl = allow_ddl
+        self._rejected = 0
+        self._downgraded = 0
+
+    def _is_destructive_ddl(
+        self, conn: duckdb.DuckDBPyConnection, statement: duckdb.Statement
+    ) -> bool:
+        raw_tokens = _tokens(statement.query)
+        tokens = [t.upper() for t in raw_tokens]
+        temp = bool({"TEMP", "TEMPORARY"} & set(tokens[:5]))
+        if statement.type == duckdb.StatementType.CREATE:
+            return tokens[1:3] == ["OR", "REPLACE"] and not temp
+        if statement.type != duckdb.StatementType.DROP:
+            return statement.type in DESTRUCTIVE_DDL_STATEMENTS
+
+        # dropping a temp table or view only affects the caller's own scratch objects
+        names = [t for t in raw_tokens[2:] if t.upper() not in ("IF", "EXISTS")]
+        while names and names[-1].upper() in (";", "CASCADE", "RESTRICT"):
+            names.pop()
+        name = _unquote("".join(names)).split(".")
+        if "," in names or tokens[1] not in ("TABLE", "VIEW") or name[:-1] not in ([], ["temp"]):
+            return True
+        temporary = conn.execute(
+            "SELECT count(*) FROM duckdb_tables() WHERE temporary AND lower(table_name) = ? "
+            "UNION ALL "
+            "SELECT count(*) FROM duckdb_views() WHERE temporary AND lower(view_name) = ?",
+            [name[-1], name[-1]],
+        ).fetchall()
+        return not any(count for count, in temporary)
+
+    def _check_policy(
+        self, conn: duckdb.DuckDBPyConnection, statement: duckdb.Statement
+    ) -> None:
+        if statement.type == duckdb.StatementType.DELETE and not self._allow_delete:
+            raise ValueError(
+                "DELETE is not allowed by the server policy; prefer an UPDATE (e.g. status='closed')"
+            )
+        if not self._allow_ddl and self._is_destructive_ddl(conn, statement):
+            raise ValueError(
+                f"Destructive {statement.type.name} statements are not allowed by the server policy"
+            )
+        if self._writable_tables is None:
+            return
+
+        # matched on tokens, so comments can't pose as the target
+        if statement.type == duckdb.StatementType.COPY:
+            target = _copy_target(_tokens(statement.query))
+            if target is None:
+                return
+        elif statement.type in WRITE_TARGET_KEYWORDS:
+            target = _write_target(statement.type, _tokens(statement.query))
+        else:
+            return
+
+        if target not in self._writable_tables:
+            raise ValueError(
+                f"{statement.type.name} on `{target}` is not allowed by the server policy; "
+                f"writable tables: {', '.join(sorted(self._writable_tables))}"
+            )
+
+    def _estimate(
+        self, conn: duckdb.DuckDBPyConnection, statement: str
+    ) -> tuple[int, int] | None:
+        """Estimated result rows and largest join output of a statement, or None if it can't be planned"""
+        try:
+            rows = conn.execute(f"EXPLAIN (FORMAT json) {statement}").fetchall()
+        except Exception as e:
+            # e.g. depends on objects created earlier in the same batch; let execution decide
+            logger.debug(f"Pre-flight EXPLAIN skipped: {e}")
+            return None
+        return _plan_estimate([node for _, plan in rows for node in json.loads(plan)])
+
+    def check(
+        self,
+        conn: duckdb.DuckDBPyConnection,
+        query: str,
+        action: Literal["reject", "limit"] | None = None,
+        judge_output: bool = True,
+    ) -> tuple[str, str | None]:
+        """
+        Return the query to run and an optional notice for the caller.
+        Raises ValueError when the query is rejected. `action` overrides the
+        configured one, and `judge_output=False` only judges joins, e.g. for
+        exports, which are meant for large results but must not be truncated.
+        """
+        action = action or self._action
+        statements = conn.extract_statements(query)
+        for statement in statements:
+            try:
+                self._check_policy(conn, statement)
+            except ValueError:
+                self._rejected += 1
+                raise
+
+        for statement in statements:
+            if statement.type not in (
+                duckdb.StatementType.SELECT,
+                duckdb.StatementType.INSERT,
+                duckdb.StatementType.UPDATE,
+                duckdb.StatementType.DELETE,
+            ):
+                continue
+
+            text = statement_text(statement.query)
+            estimates = self._estimate(conn, text)
+            if estimates is None:
+                continue
+            output, joins = estimates
+            if statement.type != duckdb.StatementType.SELECT or not judge_output:
+                # writes don't return their rows, so only their joins are judged
+                output = 0
+            estimate = max(output, joins)
+            if estimate <= self._max_estimated_rows:
+                continue
+
+            # a LIMIT only helps when the large join streams straight into the
+            # result, not when it is aggregated away first
+            if (
+                action == "limit"
+                and len(statements) == 1
+                and statement.type == duckdb.StatementType.SELECT
+                and output >= joins
+            ):
+                self._downgraded += 1
+                logger.warning(
+                    f"Pre-flight: estimated {estimate} rows, limiting query to {self._limit_rows} rows"
+                )
+                return (
+                    # newline so that a trailing `--` comment cannot swallow the rest
+                    f"SELECT * FROM ({text}\n) LIMIT {self._limit_rows}",
+                    f"⚠️ The planner estimates {estimate} rows for this query "
+                    f"(limit {self._max_estimated_rows}); only the first {self._limit_rows} are shown. "
+                    "Check for missing join conditions or add filters/aggregations.",
+                )
+
+            self._rejected += 1
+            raise ValueError(
+                f"Query rejected by pre-flight check: the planner estimates {estimate} rows "
+                f"(limit {self._max_estimated_rows}). Check for missing join conditions "
+                "(cartesian products) or add filters/aggregations."
+            )
+
+        return query, None
+
+    def stats(self) -> dict:
+        return {"rejected": self._rejected, "downgraded": self._downgraded}
@@ -1,6 +1,20 @@
 # -*- coding: utf-8 -*-
 
 PIANIFICATORE_UI_PROMPT_NAME = "pianificatore-ui"
+
+# Tabelle su cui la policy del prompt consente INSERT/UPDATE (vedi "Operazioni consentite e policy")
+PIANIFICATORE_UI_WRITABLE_TABLES = (
+    "users",
+    "projects",
+    "project_journal",
+    "assignments",
+    "user_capacity_overrides",
+    "user_absences",
+    "skills",
+    "user_skills",
+    "project_aero_params",
+)
+
 PIANIFICATORE_UI_INITIAL_PROMPT = r"""
 Sei un assistente AI per la gestione di commessa e l'ingengeria di commessa, per l'azienda "AEROTECH Srl".
 I tuoi utenti sono i dipendenti dell'azienda e il tuo compito è quello di assisterci nelle attività di gestione e ingengeria di commessa.
@@ -0,0 +1,182 @@
+import time
+import logging
+import anyio
+import click
+import numpy as np
+from tabulate import tabulate
+from mcp.shared.memory import create_connected_server_and_client_session
+from . import main as server_main, server_options
+from .server import build_application
+from .database import is_read_query
+from .trace import read_trace
+from .logs import configure_logging
+
+logger = logging.getLogger("mcp_server_motherduck")
+
+PERCENTILES = (50, 90, 99)
+
+
+async def replay_trace(
+    server,
+    records: list[dict],
+    concurrency: int = 1,
+    speedup: float = 1.0,
+) -> list[tuple[str, float, bool]]:
+    """
+    Re-issue traced tool calls against `server` through an in-memory client session.
+
+    Calls are started at their original offsets divided by `speedup` (`0` fires them
+    as fast as possible), with at most `concurrency` in flight. Returns
+    `(tool, latency_ms, ok)` for every call.
+    """
+    results = []
+    limiter = anyio.CapacityLimiter(concurrency)
+    first_ts = records[0]["ts"] if records else 0.0
+
+    async with create_connected_server_and_client_session(server) as session:
+
+        async def issue(record: dict) -> None:
+            async with limiter:
+                start = time.monotonic()
+                try:
+                    result = await session.call_tool(
+                        record["tool"], record.get("arguments") or {}
+                    )
+                    ok = not result.isError
+                except Exception as e:
+                    logger.warning(f"Replayed call to {record['tool']} failed: {e}")
+                    ok = False
+                results.append(
+                    (record["tool"], (time.monotonic() - start) * 1000, ok)
+                )
+
+        replay_start = time.monotonic()
+        async with anyio.create_task_group() as tg:
+            for record in records:
+                if speedup > 0:
+                    due = (record["ts"] - first_ts) / speedup
+                    delay = due - (time.monotonic() - replay_start)
+                    if delay > 0:
+                        await anyio.sleep(delay)
+                tg.start_soon(issue, record)
+
+    return results
+
+
+def latency_report(
+    results: list[tuple[str, float, bool]], wall_seconds: float
+) -> str:
+    rows = []
+    groups = sorted({tool for tool, _, _ in results}) + ["(all)"]
+    for group in groups:
+        selected = [r for r in results if group == "(all)" or r[0] == group]
+        latencies = np.array([latency for _, latency, _ in selected])
+        rows.append(
+            [
+                group,
+                len(selected),
+                sum(1 for _, _, ok in selected if not ok),
+                *(round(v, 1) for v in np.percentile(latencies, PERCENTILES)),
+                round(latencies.max(), 1),
+            ]
+        )
+
+    return (
+        tabulate(
+            rows,
+            headers=["tool", "calls", "errors"]
+            + [f"p{p}_ms" for p in PERCENTILES]
+            + ["max_ms"],
+            tablefmt="pretty",
+        )
+        + f"\n{len(results)} calls in {wall_seconds:.2f} s "
+        f"({len(results) / wall_seconds if wall_seconds else 0:.1f} calls/s)"
+    )
+
+
+@click.command(context_settings={"ignore_unknown_options": True})
+@click.argument("trace_file", type=click.Path(exists=True, dir_okay=False))
+@click.argument("server_args", nargs=-1, type=click.UNPROCESSED)
+@click.option(
+    "--concurrency",
+    type=int,
+    default=1,
+    help="(Default: `1`) Maximum number of tool calls the replay client keeps in flight. The server runs them concurrently in worker threads, still subject to its own `--max-concurrent-queries` admission control",
+)
+@click.option(
+    "--speedup",
+    type=float,
+    default=1.0,
+    help="(Default: `1.0`) Replay the trace this many times faster than recorded. `0` issues calls as fast as possible",
+)
+@click.option(
+    "--replay-writes",
+    is_flag=True,
+    default=False,
+    help="Also replay `query` calls that are not plain SELECTs. Only allowed against local databases, never `md:`",
+)
+@click.option(
+    "--tool",
+    "tools",
+    multiple=True,
+    help="Only replay calls to this tool (repeatable)",
+)
+def main(trace_file, server_args, concurrency, speedup, replay_writes, tools):
+    """
+    Replay a tool call trace recorded with `--trace-file` and report latencies.
+
+    Any other option (e.g. `--db-path`, `--max-concurrent-queries`,
+    `--summarize-rows`, `--replica-tables`, `--preflight-max-rows`) configures
+    the replayed server exactly like `mcp-server-motherduck`. Write queries are
+    skipped unless `--replay-writes` is given.
+    """
+
+    configure_logging()
+    with server_main.make_context("mcp-server-motherduck", list(server_args)) as ctx:
+        options = server_options(ctx.params)
+
+    records = read_trace(trace_file)
+    if tools:
+        records = [r for r in records if r["tool"] in tools]
+    if replay_writes:
+        # a replay must never re-apply recorded writes to a MotherDuck database
+        remote = [
+            path
+            for path in [options["db_path"]]
+            + [spec["db_path"] for spec in options["databases"].values()]
+            if path.startswith(("md:", "motherduck:"))
+        ]
+        if remote:
+            raise click.UsageError(
+                f"--replay-writes needs local databases, got {', '.join(remote)}; "
+                "pass --db-path with a copy of the database"
+            )
+    else:
+        replayed = [
+            r
+            for r in records
+            if r["tool"] != "query"
+            or is_read_query((r.get("arguments") or {}).get("query", ""))
+        ]
+        if len(replayed) < len(records):
+            logger.info(
+                f"Skipping {len(records) - len(replayed)} write queries, "
+                "pass --replay-writes to replay them"
+            )
+        records = replayed
+    if not records:
+        raise click.UsageError(f"No tool calls to replay in {trace_file}")
+
+    logger.info(
+        f"Replaying {len(records)} tool calls from `{trace_file}` "
+        f"(concurrency {concurrency}, speed-up {speedup or 'max'})"
+    )
+    server, _ = build_application(**options)
+
+    start = time.monotonic()
+    results = anyio.run(replay_trace, server, records, concurrency, speedup)
+    click.echo(latency_report(results, time.monotonic() - start))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import re
+import json
+import threading
+import time
+import logging
+import duckdb
+from contextlib import contextmanager
+from collections.abc import Iterator
+
+logger = logging.getLogger("mcp_server_motherduck")
+
+REPLICA_DATABASE = "mcp_replica"
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _has_qualified_table_ref(node: dict | list) -> bool:
+    """Whether a `json_serialize_sql` tree references a table with a catalog or schema"""
+    if isinstance(node, list):
+        return any(_has_qualified_table_ref(n) for n in node)
+    if not isinstance(node, dict):
+        return False
+    if node.get("type") == "BASE_TABLE" and (
+        node.get("catalog_name") or node.get("schema_name")
+    ):
+        return True
+    return any(_has_qualified_table_ref(v) for v in node.values())
+
+
+class LocalReplica:
+    """
+    Local DuckDB snapshots of hot, slowly changing tables.
+
+    The replica is attached to the main connection as `mcp_replica`. Reads that
+    only touch replicated tables run on a cursor whose default database is the
+    replica, so they never leave the process. Snapshots are refreshed on a
+    schedule and whenever a write through this server mentions a replicated table.
+    Writes made outside this server are only picked up by the schedule, so a
+    snapshot older than two refresh intervals (e.g. after failed refreshes) is
+    not served.
+    """
+
+    def __init__(
+        self,
+        conn: duckdb.DuckDBPyConnection,
+        tables: list[str],
+        path: str = ":memory:",
+        refresh_seconds: float = 60.0,
+    ):
+        if not refresh_seconds or refresh_seconds <= 0:
+            raise ValueError("The local replica needs a positive refresh interval")
+
+        self._conn = conn
+        self._tables = {t.lower(): t for t in tables}
+        self._lock = threading.Lock()
+        # replicated table -> monotonic time of its last snapshot
+        self._fresh: dict[str, float] = {}
+        self._max_staleness = 2 * refresh_seconds
+
+        source_db, source_schema = conn.execute(
+            "SELECT current_database(), current_schema()"
+        ).fetchone()
+        self._source = f"{_quote(source_db)}.{_quote(source_schema)}"
+
+        escaped_path = path.replace("'", "''")
+        conn.execute(f"ATTACH '{escaped_path}' AS {REPLICA_DATABASE}")
+        logger.info(
+            f"Local replica attached at `{path}` for tables: {', '.join(tables)}"
+        )
+
+        self.refresh()
+
+        self._stop = threading.Event()
+        thread = threading.Thread(
+            target=self._refresh_loop,
+            args=(refresh_seconds,),
+            name="mcp-replica-refresh",
+            daemon=True,
+        )
+        thread.start()
+
+    def _refresh_loop(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"❌ Scheduled replica refresh failed: {e}")
+
+    def close(self) -> None:
+        self._stop.set()
+
+    def refresh(self, tables: set[str] | None = None) -> None:
+        """Re-snapshot the given tables (all replicated tables by default)"""
+        targets = set(self._tables) if tables is None else tables & set(self._tables)
+        if not targets:
+            return
+
+        with self._lock:
+            for table in targets:
+                self._fresh.pop(table, None)
+
+        start = time.monotonic()
+        cursor = self._conn.cursor()
+        try:
+            for table in sorted(targets):
+                name = _quote(self._tables[table])
+                cursor.execute(
+                    f"CREATE OR REPLACE TABLE {REPLICA_DATABASE}.main.{name} AS "
+                    f"SELECT * FROM {self._source}.{name}"
+                )
+                with self._lock:
+                    self._fresh[table] = time.monotonic()
+        finally:
+            cursor.close()
+
+        logger.debug(
+            f"Refreshed replica of {', '.join(sorted(targets))} "
+            f"in {time.monotonic() - start:.2f}s"
+        )
+
+    def can_serve(self, query: str) -> bool:
+        """
+        Whether a read query only references replicated tables with a recent
+        snapshot. Qualified references (`archive.users`, `otherdb.main.users`)
+        may point at other tables with the same name, so they are never served.
+        """
+        cursor = self._conn.cursor()
+        try:
+            tables = {t.lower() for t in cursor.get_table_names(query)}
+            tree = json.loads(
+                cursor.execute("SELECT json_serialize_sql(?)", [query]).fetchone()[0]
+            )
+        except Exception:
+            return False
+        finally:
+            cursor.close()
+        if tree.get("error") or _has_qualified_table_ref(tree):
+            return False
+
+        now = time.monotonic()
+        with self._lock:
+            return bool(tables) and all(
+                now - self._fresh.get(table, -float("inf")) <= self._max_staleness
+                for table in tables
+            )
+
+    @contextmanager
+    def cursor(self) -> Iterator[duckdb.DuckDBPyConnection]:
+        """A dedicated cursor whose default database is the replica"""
+        cursor = self._conn.cursor()
+        try:
+            cursor.execute(f"USE {REPLICA_DATABASE}")
+            yield cursor
+        finally:
+            cursor.close()
+
+    def run(
+        self, query: str, parameters: list | None = None
+    ) -> tuple[list, list]:
+        """Run a read query against the replica"""
+        with self.cursor() as cursor:
+            q = cursor.execute(query, parameters)
+            rows = q.fetchall()
+            return q.description, rows
+
+    def notify_write(self, query: str) -> None:
+        """Refresh replicated tables mentioned by a write that went through this server"""
+        touched = {
+            table
+            for table in self._tables
+            if re.search(rf"\b{re.escape(table)}\b", query, re.IGNORECASE)
+        }
+        if touched:
+            self.refresh(touched)
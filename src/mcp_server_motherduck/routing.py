@@ -0,0 +1,89 @@
+import logging
+import threading
+from collections.abc import Callable
+from .database import DatabaseClient
+
+logger = logging.getLogger("mcp_server_motherduck")
+
+
+def parse_database_spec(spec: str) -> tuple[str, dict]:
+    """
+    Parse a `name=path[,read_only][,saas_mode]` database spec into its name and
+    `DatabaseClient` arguments.
+    """
+    name, sep, rest = spec.partition("=")
+    if not sep or not name.strip() or not rest.strip():
+        raise ValueError(
+            f"Invalid database spec `{spec}`, expected `name=path[,read_only][,saas_mode]`"
+        )
+
+    db_path, *flags = [part.strip() for part in rest.split(",")]
+    unknown = set(flags) - {"read_only", "saas_mode"}
+    if unknown:
+        raise ValueError(
+            f"Unknown option(s) {', '.join(sorted(unknown))} for database `{name.strip()}`"
+        )
+    return name.strip(), {
+        "db_path": db_path,
+        "read_only": "read_only" in flags,
+        "saas_mode": "saas_mode" in flags,
+    }
+
+
+class DatabaseRouter:
+    """
+    Route queries to one of several named databases.
+
+    The default database is the one passed with `--db-path` and is connected at
+    startup. Named databases get their own `DatabaseClient` (and therefore their
+    own connection, cursors and read-only/SaaS settings), created on first use.
+    """
+
+    def __init__(
+        self,
+        default: DatabaseClient,
+        databases: dict[str, dict] | None = None,
+        client_factory: Callable[..., DatabaseClient] = DatabaseClient,
+    ):
+        self.default = default
+        self._specs = databases or {}
+        self._client_factory = client_factory
+        self._clients: dict[str, DatabaseClient] = {}
+        self._lock = threading.Lock()
+
+    def names(self) -> list[str]:
+        return list(self._specs)
+
+    def get(self, name: str | None = None) -> DatabaseClient:
+        if name is None:
+            return self.default
+        if name not in self._specs:
+            raise ValueError(
+                f"Unknown database `{name}`; available: {', '.join(self._specs) or 'none'}"
+            )
+
+        client = self._clients.get(name)
+        if client is not None:
+            return client
+
+        with self._lock:
+            if name not in self._clients:
+                logger.info(f"Attaching database `{name}` on first use")
+                self._clients[name] = self._client_factory(**self._specs[name])
+            return self._clients[name]
+
+    def close_session(self, session_id: str) -> None:
+        """Release the session cursors held for a session that ended, in every database"""
+        for client in [self.default, *self._clients.values()]:
+            if client.sessions is not None:
+                client.sessions.close(session_id)
+
+    def stats(self) -> dict:
+        return {
+            name: {
+                "attached": name in self._clients,
+                "read_only": spec["read_only"],
+                "saas_mode": spec["saas_mode"],
+            }
+            for name, spec in self._specs.items()
+        }
@@ -0,0 +1,105 @@
+import logging
+import threading
+from .database import DatabaseClient
+
+logger = logging.getLogger("mcp_server_motherduck")
+
+# Temp objects live in the `temp` database, so this also leaves them out
+CATALOG_FILTER = "database_name = current_database() AND NOT internal"
+
+
+class SchemaPromptCache:
+    """
+    Prompts rendered with a live snapshot of the connected database's schema.
+
+    Each rendered prompt is cached together with the catalog fingerprint it was
+    built from, and is only rebuilt when the fingerprint changes (a table, view or
+    column was added, dropped or altered).
+    """
+
+    def __init__(self, db_client: DatabaseClient):
+        self._db = db_client
+        self._lock = threading.Lock()
+        # prompt name -> (fingerprint, rendered prompt)
+        self._cache: dict[str, tuple[tuple, str]] = {}
+
+    def fingerprint(self) -> tuple:
+        """Cheap, catalog-only fingerprint of tables, views and their columns"""
+        _, rows = self._db.fetch(
+            f"""
+            SELECT count(*), sum(hash(schema_name, table_name, column_name, data_type))
+            FROM duckdb_columns()
+            WHERE {CATALOG_FILTER}
+            """
+        )
+        return rows[0]
+
+    def _snapshot(self) -> str:
+        _, columns = self._db.fetch(
+            f"""
+            SELECT schema_name, table_name, string_agg(column_name, ', ' ORDER BY column_index)
+            FROM duckdb_columns()
+            WHERE {CATALOG_FILTER}
+            GROUP BY ALL
+            """
+        )
+        columns_by_table = {(schema, table): cols for schema, table, cols in columns}
+
+        _, tables = self._db.fetch(
+            f"""
+            SELECT schema_name, table_name, estimated_size
+            FROM duckdb_tables()
+            WHERE {CATALOG_FILTER}
+            ORDER BY schema_name, table_name
+            """
+        )
+        _, views = self._db.fetch(
+            f"""
+            SELECT schema_name, view_name
+            FROM duckdb_views()
+            WHERE {CATALOG_FILTER}
+            ORDER BY schema_name, view_name
+            """
+        )
+
+        def qualified(schema: str, name: str) -> str:
+            return name if schema == "main" else f"{schema}.{name}"
+
+        lines = ["Tabelle:"]
+        lines += [
+            f"- {qualified(schema, table)}({columns_by_table.get((schema, table), '')}) ~{size} righe"
+            for schema, table, size in tables
+        ] or ["- (nessuna)"]
+        lines.append("Viste:")
+        lines += [
+            f"- {qualified(schema, view)}({columns_by_table.get((schema, view), '')})"
+            for schema, view in views
+        ] or ["- (nessuna)"]
+        return "\n".join(lines)
+
+    def render(self, name: str, base_prompt: str) -> str:
+        """Return `base_prompt` followed by the current schema, rebuilt only on catalog changes"""
+        try:
+            fingerprint = self.fingerprint()
+        except Exception as e:
+            logger.warning(f"Could not read the catalog, serving static prompt: {e}")
+            return base_prompt
+
+        with self._lock:
+            cached = self._cache.get(name)
+            if cached is not None and cached[0] == fingerprint:
+                return cached[1]
+
+        version = f"{hash(fingerprint) & 0xFFFFFFFF:08x}"
+        rendered = (
+            base_prompt.rstrip()
+            + "\n\n#### Schema attuale del database connesso "
+            + f"(snapshot automatico, versione {version})\n"
+            + "Usa questo elenco invece di interrogare il catalogo: è già aggiornato.\n"
+            + self._snapshot()
+            + "\n"
+        )
+        with self._lock:
+            self._cache[name] = (fingerprint, rendered)
+        logger.info(f"Rendered prompt `{name}` for schema version {version}")
+        return rendered
@@ -1,17 +1,39 @@
+import json
+import base64
 import logging
+import time
+import functools
+import anyio
 from pydantic import AnyUrl
 from typing import Literal
+from collections.abc import Callable
 import mcp.types as types
 from mcp.server import NotificationOptions, Server
 from mcp.server.models import InitializationOptions
 from .configs import SERVER_VERSION
 from .database import DatabaseClient
+from .similarity import ProjectSimilarityIndex
+from .admission import AdmissionController
+from .tuning import derive_settings
+from .schema import SchemaPromptCache
+from .logs import LogSampler, loggable_arguments
+from .export import QueryExporter
+from .preflight import PreflightGuard
+from .trace import TraceRecorder
+from .routing import DatabaseRouter
+from .charts import UtilizationChart
 from .prompt import PROMPT_TEMPLATE
-from .prompt_it import PIANIFICATORE_UI_PROMPT_NAME, PIANIFICATORE_UI_INITIAL_PROMPT
+from .prompt_it import (
+    PIANIFICATORE_UI_PROMPT_NAME,
+    PIANIFICATORE_UI_INITIAL_PROMPT,
+    PIANIFICATORE_UI_WRITABLE_TABLES,
+)
 
 
 logger = logging.getLogger("mcp_server_motherduck")
 
+STATS_RESOURCE_URI = "motherduck://stats"
+
 
 def build_application(
     db_path: str,
@@ -19,27 +41,175 @@ def build_application(
     home_dir: str | None = None,
     saas_mode: bool = False,
     read_only: bool = False,
+    replica_tables: list[str] | None = None,
+    replica_path: str = ":memory:",
+    replica_refresh_seconds: float = 60.0,
+    summarize_rows: int | None = None,
+    summarize_bytes: int | None = None,
+    stateful_sessions: bool = False,
+    max_sessions: int = 64,
+    max_concurrent_queries: int | None = None,
+    max_queries_per_client: int | None = None,
+    max_queued_queries: int = 64,
+    queue_timeout: float = 30.0,
+    query_settings: dict[str, str] | None = None,
+    threads: int | None = None,
+    memory_limit: str | None = None,
+    temp_directory: str | None = None,
+    enable_object_cache: bool | None = None,
+    log_sql_max_chars: int = 200,
+    log_list_sample_rate: float = 1.0,
+    export_dir: str | None = None,
+    preflight_max_rows: int | None = None,
+    preflight_action: Literal["reject", "limit"] = "reject",
+    preflight_limit_rows: int = 1000,
+    allow_delete: bool = False,
+    allow_ddl: bool = False,
+    trace_file: str | None = None,
+    databases: dict[str, dict] | None = None,
+    stats_sources: dict[str, Callable[[], dict]] | None = None,
+    session_close_listeners: list[Callable[[str], None]] | None = None,
 ):
     logger.info("Starting MotherDuck MCP Server")
     server = Server("pianificatore_ui")
-    db_client = DatabaseClient(
-        db_path=db_path,
-        motherduck_token=motherduck_token,
-        home_dir=home_dir,
-        saas_mode=saas_mode,
+
+    preflight = None
+    # the planner's write policy only describes the default database, other
+    # databases just get the cost check
+    named_preflight = None
+    if preflight_max_rows is not None:
+        preflight = PreflightGuard(
+            max_estimated_rows=preflight_max_rows,
+            action=preflight_action,
+            limit_rows=preflight_limit_rows,
+            writable_tables=PIANIFICATORE_UI_WRITABLE_TABLES,
+            allow_delete=allow_delete,
+            allow_ddl=allow_ddl,
+        )
+        named_preflight = PreflightGuard(
+            max_estimated_rows=preflight_max_rows,
+            action=preflight_action,
+            limit_rows=preflight_limit_rows,
+            allow_delete=True,
+            allow_ddl=True,
+        )
+        logger.info(
+            f"Pre-flight guard enabled: {preflight_action} above {preflight_max_rows} estimated rows"
+        )
+
+    # every database is its own DuckDB instance, so they share the memory budget
+    instances = 1 + len(databases or {})
+
+    def connect_database(
+        db_path: str,
+        read_only: bool = False,
+        saas_mode: bool = False,
+        preflight: PreflightGuard | None = named_preflight,
+        **options,
+    ) -> DatabaseClient:
+        return DatabaseClient(
+            db_path=db_path,
+            motherduck_token=motherduck_token,
+            home_dir=home_dir,
+            saas_mode=saas_mode,
+            read_only=read_only,
+            summarize_rows=summarize_rows,
+            summarize_bytes=summarize_bytes,
+            stateful_sessions=stateful_sessions,
+            max_sessions=max_sessions,
+            query_settings=query_settings,
+            settings=derive_settings(
+                threads=threads,
+                memory_limit=memory_limit,
+                temp_directory=temp_directory,
+                enable_object_cache=enable_object_cache,
+                allow_spill=not saas_mode,
+                instances=instances,
+            ),
+            preflight=preflight,
+            **options,
+        )
+
+    db_client = connect_database(
+        db_path,
         read_only=read_only,
+        saas_mode=saas_mode,
+        preflight=preflight,
+        replica_tables=replica_tables,
+        replica_path=replica_path,
+        replica_refresh_seconds=replica_refresh_seconds,
     )
+    router = DatabaseRouter(db_client, databases, client_factory=connect_database)
+    if session_close_listeners is not None:
+        session_close_listeners.append(router.close_session)
+    similarity_index = ProjectSimilarityIndex(db_client)
+    utilization_chart = UtilizationChart(db_client)
+    schema_prompts = SchemaPromptCache(db_client)
+    sample_list_logs = LogSampler(log_list_sample_rate)
+    exporter = QueryExporter(db_client, export_dir) if export_dir else None
+    tracer = TraceRecorder(trace_file) if trace_file else None
+
+    admission = None
+    if max_concurrent_queries is not None:
+        admission = AdmissionController(
+            max_concurrent=max_concurrent_queries,
+            max_per_client=max_queries_per_client,
+            max_queue=max_queued_queries,
+            queue_timeout=queue_timeout,
+        )
+        logger.info(
+            f"Admission control enabled: {max_concurrent_queries} concurrent queries, "
+            f"{max_queries_per_client or max_concurrent_queries} per client"
+        )
+
+    # Name -> callable returning a JSON-serializable dict, exposed as a resource
+    stats_sources = {"singleflight": db_client.singleflight.stats, **(stats_sources or {})}
+    if admission is not None:
+        stats_sources["admission"] = admission.stats
+    if preflight is not None:
+        stats_sources["preflight"] = preflight.stats
+        if databases:
+            stats_sources["preflight_databases"] = named_preflight.stats
+    if databases:
+        stats_sources["databases"] = router.stats
+
+    def current_session_id() -> str | None:
+        """MCP session id of the current HTTP request, if any"""
+        request = server.request_context.request
+        if request is None:
+            return None
+        return request.headers.get("mcp-session-id")
+
+    def current_client_id() -> str:
+        """Best-effort identity of the calling client, used for per-client quotas"""
+        request = server.request_context.request
+        if request is None:
+            return "default"
+        return (
+            request.headers.get("x-client-id")
+            or request.headers.get("mcp-session-id")
+            or (request.client.host if request.client else "default")
+        )
 
     logger.info("Registering handlers")
 
     @server.list_resources()
     async def handle_list_resources() -> list[types.Resource]:
         """
-        List available note resources.
-        Each note is exposed as a resource with a custom note:// URI scheme.
+        List available resources.
+        Server statistics are exposed as a JSON resource when any subsystem reports them.
         """
-        logger.info("No resources available to list")
-        return []
+        if not stats_sources:
+            logger.info("No resources available to list")
+            return []
+        return [
+            types.Resource(
+                uri=STATS_RESOURCE_URI,
+                name="Server statistics",
+                description="Contatori di esecuzione del server (admission control, ecc.) in formato JSON.",
+                mimeType="application/json",
+            )
+        ]
 
     @server.read_resource()
     async def handle_read_resource(uri: AnyUrl) -> str:
@@ -48,6 +218,10 @@ def build_application(
         The note name is extracted from the URI host component.
         """
         logger.info(f"Reading resource: {uri}")
+        if str(uri) == STATS_RESOURCE_URI and stats_sources:
+            return json.dumps(
+                {name: source() for name, source in stats_sources.items()}, indent=2
+            )
         raise ValueError(f"Unsupported URI scheme: {uri.scheme}")
 
     @server.list_prompts()
@@ -56,7 +230,8 @@ def build_application(
         List available prompts.
         Each prompt can have optional arguments to customize its behavior.
         """
-        logger.info("Listing prompts")
+        if sample_list_logs():
+            logger.info("Listing prompts")
         # TODO: Check where and how this is used, and how to optimize this.
         # Check postgres and sqlite servers.
         return [
@@ -80,15 +255,18 @@ def build_application(
         The prompt includes all current notes and can be customized via arguments.
         """
         logger.info(f"Getting prompt: {name}::{arguments}")
-        # TODO: Check where and how this is used, and how to optimize this.
-        # Check postgres and sqlite servers.
         if name == PIANIFICATORE_UI_PROMPT_NAME:
             return types.GetPromptResult(
                 description="Prompt di avvio per pianificatore_ui: pianificazione risorse, viste, e INSERT/UPDATE consentiti.",
                 messages=[
                     types.PromptMessage(
                         role="user",
-                        content=types.TextContent(type="text", text=PIANIFICATORE_UI_INITIAL_PROMPT),
+                        content=types.TextContent(
+                            type="text",
+                            text=schema_prompts.render(
+                                name, PIANIFICATORE_UI_INITIAL_PROMPT
+                            ),
+                        ),
                     )
                 ],
             )
@@ -98,7 +276,10 @@ def build_application(
                 messages=[
                     types.PromptMessage(
                         role="user",
-                        content=types.TextContent(type="text", text=PROMPT_TEMPLATE),
+                        content=types.TextContent(
+                            type="text",
+                            text=schema_prompts.render(name, PROMPT_TEMPLATE),
+                        ),
                     )
                 ],
             )
@@ -111,24 +292,196 @@ def build_application(
         List available tools.
         Each tool specifies its arguments using JSON Schema validation.
         """
-        logger.info("Listing tools")
-        return [
+        if sample_list_logs():
+            logger.info("Listing tools")
+        query_properties = {
+            "query": {
+                "type": "string",
+                "description": "Query SQL (DuckDB) da eseguire: SELECT/CTE e, se necessario, INSERT/UPDATE.",
+            },
+            "priority": {
+                "type": "string",
+                "enum": ["interactive", "batch"],
+                "description": "Priorità di esecuzione quando il server è carico: `interactive` (default) passa davanti a `batch`.",
+                "default": "interactive",
+            },
+        }
+        if databases:
+            query_properties["database"] = {
+                "type": "string",
+                "enum": router.names(),
+                "description": "Database su cui eseguire la query. Se omesso si usa il database principale (pianificatore).",
+            }
+
+        tools = [
             types.Tool(
                 name="query",
                 description="Esegui una query SQL (dialetto DuckDB) su MotherDuck/DuckDB. "
                             "Supporta SELECT/CTE e, se richiesto, anche INSERT/UPDATE sulle tabelle autorizzate.",
+                inputSchema={
+                    "type": "object",
+                    "properties": query_properties,
+                    "required": ["query"],
+                },
+            ),
+            types.Tool(
+                name="similar_projects",
+                description="Trova i progetti passati più simili a un progetto (per codice) o a un insieme di parametri "
+                            "aerospaziali, usando una ricerca kNN sui campi di `project_aero_params` normalizzati.",
                 inputSchema={
                     "type": "object",
                     "properties": {
-                        "query": {
+                        "project_code": {
+                            "type": "string",
+                            "description": "Codice del progetto di riferimento (es. 'PRJ-021'), con parametri già collegati.",
+                        },
+                        "params": {
+                            "type": "object",
+                            "description": "In alternativa a `project_code`: valori dei parametri (es. {\"material_type\": \"Carbon\", \"wing_span_m\": 12.5}).",
+                        },
+                        "k": {
+                            "type": "integer",
+                            "description": "Numero di progetti simili da restituire (default 5).",
+                            "default": 5,
+                        },
+                        "metric": {
                             "type": "string",
-                            "description": "Query SQL (DuckDB) da eseguire: SELECT/CTE e, se necessario, INSERT/UPDATE.",
+                            "enum": ["cosine", "euclidean"],
+                            "description": "Metrica di similarità (default `cosine`).",
+                            "default": "cosine",
+                        },
+                    },
+                },
+            ),
+            types.Tool(
+                name="render_utilization",
+                description="Genera lato server un'immagine PNG compatta dello staffing: heatmap dell'utilizzo "
+                            "persona×giorno (`heatmap`) o diagramma di Gantt dei progetti con gli FTE allocati (`gantt`), "
+                            "con una legenda testuale. Da preferire all'estrazione di migliaia di righe di "
+                            "`v_user_daily_utilization` quando serve una visione d'insieme.",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "chart": {
+                            "type": "string",
+                            "enum": ["heatmap", "gantt"],
+                            "description": "Tipo di grafico (default `heatmap`).",
+                            "default": "heatmap",
+                        },
+                        "start_date": {
+                            "type": "string",
+                            "description": "Data iniziale (YYYY-MM-DD); default: inizio di `v_days_rolling_180`.",
+                        },
+                        "end_date": {
+                            "type": "string",
+                            "description": "Data finale (YYYY-MM-DD); default: fine di `v_days_rolling_180`.",
+                        },
+                        "granularity": {
+                            "type": "string",
+                            "enum": ["day", "week"],
+                            "description": "Una colonna per giorno o per settimana (default `day`). Oltre 366 giorni si passa a settimane; oltre 366 settimane l'intervallo viene rifiutato.",
+                            "default": "day",
                         },
                     },
-                    "required": ["query"],
                 },
             ),
         ]
+        if exporter is not None:
+            tools.append(
+                types.Tool(
+                    name="export_query",
+                    description="Esporta il risultato di una SELECT direttamente in un file Parquet (ZSTD) o CSV sul server, "
+                                "senza restituire le righe. Restituisce solo percorso, numero di righe, dimensione e durata. "
+                                "Da usare per estrazioni grandi (es. allocazioni di un anno intero).",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "query": {
+                                "type": "string",
+                                "description": "SELECT (dialetto DuckDB) da esportare.",
+                            },
+                            "path": {
+                                "type": "string",
+                                "description": "Percorso del file (o della cartella, se partizionato) relativo alla cartella di export.",
+                            },
+                            "format": {
+                                "type": "string",
+                                "enum": ["parquet", "csv"],
+                                "description": "Formato del file (default `parquet`).",
+                                "default": "parquet",
+                            },
+                            "partition_by": {
+                                "type": "array",
+                                "items": {"type": "string"},
+                                "description": "Colonne per il partizionamento Hive (opzionale).",
+                            },
+                        },
+                        "required": ["query", "path"],
+                    },
+                )
+            )
+        return tools
+
+    def call_tool(
+        name: str, arguments: dict | None, session_id: str | None
+    ) -> tuple[
+        list[types.TextContent | types.ImageContent | types.EmbeddedResource],
+        int | None,
+    ]:
+        """Run a tool, returning its content and the number of result rows (if any)"""
+        if name == "query":
+            if arguments is None:
+                return [
+                    types.TextContent(type="text", text="Error: No query provided")
+                ], None
+            tool_response, rows = router.get(arguments.get("database")).run_query(
+                arguments["query"], session_id=session_id
+            )
+            return [types.TextContent(type="text", text=str(tool_response))], rows
+
+        if name == "similar_projects":
+            arguments = arguments or {}
+            tool_response = similarity_index.search(
+                project_code=arguments.get("project_code"),
+                params=arguments.get("params"),
+                k=int(arguments.get("k", 5)),
+                metric=arguments.get("metric", "cosine"),
+            )
+            return [types.TextContent(type="text", text=str(tool_response))], None
+
+        if name == "render_utilization":
+            arguments = arguments or {}
+            png, legend, rows = utilization_chart.render(
+                chart=arguments.get("chart", "heatmap"),
+                start_date=arguments.get("start_date"),
+                end_date=arguments.get("end_date"),
+                granularity=arguments.get("granularity", "day"),
+                session_id=session_id,
+            )
+            return [
+                types.ImageContent(
+                    type="image",
+                    data=base64.b64encode(png).decode(),
+                    mimeType="image/png",
+                ),
+                types.TextContent(type="text", text=legend),
+            ], rows
+
+        if name == "export_query" and exporter is not None:
+            if arguments is None:
+                return [types.TextContent(type="text", text="Error: No query provided")], None
+            tool_response = exporter.export(
+                arguments["query"],
+                arguments["path"],
+                format=arguments.get("format", "parquet"),
+                partition_by=arguments.get("partition_by"),
+                session_id=session_id,
+            )
+            return [types.TextContent(type="text", text=str(tool_response))], None
+
+        return [
+            types.TextContent(type="text", text=f"Unsupported tool: {name}")
+        ], None
 
     @server.call_tool()
     async def handle_tool_call(
@@ -138,22 +491,76 @@ def build_application(
         Handle tool execution requests.
         Tools can modify server state and notify clients of changes.
         """
-        logger.info(f"Calling tool: {name}::{arguments}")
+        started_at = time.time()
+        start = time.monotonic()
+        logged_arguments = loggable_arguments(arguments, log_sql_max_chars)
+        session_id = current_session_id()
+        # tool calls run in worker threads, so concurrent calls never block the
+        # event loop and identical reads can be coalesced by single-flight
+        run = functools.partial(
+            anyio.to_thread.run_sync,
+            functools.partial(call_tool, name, arguments, session_id),
+        )
         try:
-            if name == "query":
-                if arguments is None:
-                    return [
-                        types.TextContent(type="text", text="Error: No query provided")
-                    ]
-                tool_response = db_client.query(arguments["query"])
-                return [types.TextContent(type="text", text=str(tool_response))]
-
-            return [types.TextContent(type="text", text=f"Unsupported tool: {name}")]
+            if admission is None:
+                content, rows = await run()
+            else:
+                priority = (arguments or {}).get("priority", "interactive")
+                async with admission.admit(current_client_id(), priority):
+                    content, rows = await run()
 
         except Exception as e:
-            logger.error(f"Error executing tool {name}: {e}")
+            duration_ms = (time.monotonic() - start) * 1000
+            logger.error(
+                f"Error executing tool {name}: {e}",
+                extra={
+                    "fields": {
+                        "event": "tool_call",
+                        "tool": name,
+                        "arguments": logged_arguments,
+                        "session_id": session_id,
+                        "duration_ms": round(duration_ms, 1),
+                        "status": "error",
+                    }
+                },
+            )
+            if tracer is not None:
+                tracer.record(
+                    name, arguments, session_id, started_at, duration_ms, "error"
+                )
             raise ValueError(f"Error executing tool {name}: {str(e)}")
 
+        duration_ms = (time.monotonic() - start) * 1000
+        logger.info(
+            f"Called tool: {name}::{logged_arguments} in {duration_ms:.1f} ms"
+            + (f" ({rows} rows)" if rows is not None else ""),
+            extra={
+                "fields": {
+                    "event": "tool_call",
+                    "tool": name,
+                    "arguments": logged_arguments,
+                    "session_id": session_id,
+                    "duration_ms": round(duration_ms, 1),
+                    "rows": rows,
+                    "status": "ok",
+                }
+            },
+        )
+        if tracer is not None:
+            tracer.record(
+                name,
+                arguments,
+                session_id,
+                started_at,
+                duration_ms,
+                "ok",
+                rows=rows,
+                result_bytes=sum(
+                    len(c.text.encode()) for c in content if isinstance(c, types.TextContent)
+                ),
+            )
+        return content
+
     initialization_options = InitializationOptions(
         server_name="motherduck",
         server_version=SERVER_VERSION,
@@ -0,0 +1,221 @@
+import time
+import logging
+import threading
+from http import HTTPStatus
+from collections import OrderedDict
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+import duckdb
+from mcp.server.lowlevel import Server
+from mcp.server.streamable_http import (
+    MCP_SESSION_ID_HEADER,
+    StreamableHTTPServerTransport,
+)
+from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+logger = logging.getLogger("mcp_server_motherduck")
+
+
+class SessionCursorPool:
+    """
+    Per-session DuckDB cursors for stateful MCP sessions.
+
+    Each session gets its own cursor on the shared connection, so temp tables,
+    `SET` options and prepared statements survive between tool calls. A cursor
+    is never used by two calls at once. The session lifecycle (idle timeout and
+    capacity) is owned by `BoundedSessionManager`, which calls `close` when a
+    session ends; a call arriving for a closed session gets an error instead of
+    silently starting over with empty state.
+    """
+
+    def __init__(self, conn: duckdb.DuckDBPyConnection, max_sessions: int = 64):
+        self._conn = conn
+        self._max_sessions = max_sessions
+        self._lock = threading.Lock()
+        # session id -> [cursor, lock, number of calls holding it]
+        self._cursors: dict[str, list] = {}
+        # recently closed session ids, bounded
+        self._closed: OrderedDict[str, None] = OrderedDict()
+
+    @staticmethod
+    def _close_cursor(session_id: str, cursor: duckdb.DuckDBPyConnection) -> None:
+        try:
+            cursor.close()
+        except Exception as e:
+            logger.error(f"❌ Failed to close cursor of session {session_id}: {e}")
+
+    @contextmanager
+    def acquire(self, session_id: str) -> Iterator[duckdb.DuckDBPyConnection]:
+        """Yield the cursor owned by a session, creating it if needed"""
+        with self._lock:
+            if session_id in self._closed:
+                raise ValueError(
+                    "Session expired: its temp tables and settings were dropped. "
+                    "Reconnect to start a new session."
+                )
+            entry = self._cursors.get(session_id)
+            if entry is None:
+                entry = self._cursors[session_id] = [self._conn.cursor(), threading.Lock(), 0]
+                logger.info(f"Opened cursor for session {session_id}")
+            entry[2] += 1
+
+        try:
+            with entry[1]:
+                yield entry[0]
+        finally:
+            with self._lock:
+                entry[2] -= 1
+                if entry[2] == 0 and self._cursors.get(session_id) is not entry:
+                    # the session was closed while this call was running
+                    self._close_cursor(session_id, entry[0])
+
+    def close(self, session_id: str) -> None:
+        """Drop the cursor of a session that ended, once its running calls finish"""
+        with self._lock:
+            self._closed[session_id] = None
+            while len(self._closed) > 4 * self._max_sessions:
+                self._closed.popitem(last=False)
+            entry = self._cursors.pop(session_id, None)
+            if entry is None:
+                return
+            if entry[2] == 0:
+                self._close_cursor(session_id, entry[0])
+            logger.info(f"Closed cursor of session {session_id}")
+
+    def __len__(self) -> int:
+        return len(self._cursors)
+
+
+class BoundedSessionManager(StreamableHTTPSessionManager):
+    """
+    Stateful `StreamableHTTPSessionManager` with a bounded number of sessions.
+
+    The upstream manager keeps every transport forever, even after the client
+    terminates it. Here, terminated transports are dropped, sessions without a
+    request for `idle_ttl` seconds are terminated, and the least recently used
+    idle session is terminated when a new one would exceed `max_sessions`.
+    `on_close` callbacks receive the id of every session that ends, so that its
+    DuckDB cursors can be released.
+    """
+
+    def __init__(
+        self,
+        app: Server,
+        max_sessions: int = 64,
+        idle_ttl: float = 900.0,
+        on_close: list[Callable[[str], None]] | None = None,
+        **kwargs,
+    ):
+        super().__init__(app=app, stateless=False, **kwargs)
+        self._check_mcp_internals()
+        self._max_sessions = max_sessions
+        self._idle_ttl = idle_ttl
+        self._on_close = on_close or []
+        self._last_seen: dict[str, float] = {}
+        # POST/DELETE requests in flight; long lived GET streams don't count
+        self._busy: dict[str, int] = {}
+        # recently ended session id -> reason, bounded
+        self._ended: OrderedDict[str, str] = OrderedDict()
+
+    def _check_mcp_internals(self) -> None:
+        """Fail at startup, rather than on the first request, if mcp changed the private API used here"""
+        missing = [
+            name
+            for owner, name in (
+                (self, "_server_instances"),
+                (self, "_handle_stateful_request"),
+                (StreamableHTTPServerTransport, "_terminate_session"),
+                (StreamableHTTPServerTransport(mcp_session_id=None), "_terminated"),
+            )
+            if not hasattr(owner, name)
+        ]
+        if missing:
+            raise RuntimeError(
+                "The installed mcp version is not supported by `--stateful` "
+                f"(missing {', '.join(missing)}); install mcp>=1.9.4,<1.10"
+            )
+
+    async def _end_session(self, session_id: str, reason: str) -> None:
+        transport = self._server_instances.pop(session_id, None)
+        self._last_seen.pop(session_id, None)
+        self._busy.pop(session_id, None)
+        # private transport API, checked at startup by `_check_mcp_internals`
+        if transport is not None and not transport._terminated:
+            await transport._terminate_session()
+        self._ended[session_id] = reason
+        while len(self._ended) > 4 * self._max_sessions:
+            self._ended.popitem(last=False)
+        for callback in self._on_close:
+            try:
+                callback(session_id)
+            except Exception as e:
+                logger.error(f"❌ Failed to release session {session_id}: {e}")
+        logger.info(f"Ended session {session_id} ({reason})")
+
+    async def _sweep(self, now: float) -> None:
+        for session_id, transport in list(self._server_instances.items()):
+            if transport._terminated:
+                await self._end_session(session_id, "terminated")
+            elif (
+                not self._busy.get(session_id)
+                and now - self._last_seen.get(session_id, now) > self._idle_ttl
+            ):
+                await self._end_session(session_id, "idle")
+
+    async def _make_room(self) -> bool:
+        while len(self._server_instances) >= self._max_sessions:
+            idle = [
+                session_id
+                for session_id in self._server_instances
+                if not self._busy.get(session_id)
+            ]
+            if not idle:
+                return False
+            lru = min(idle, key=lambda session_id: self._last_seen.get(session_id, 0.0))
+            await self._end_session(lru, "capacity")
+        return True
+
+    async def _handle_stateful_request(
+        self, scope: Scope, receive: Receive, send: Send
+    ) -> None:
+        session_id = Headers(scope=scope).get(MCP_SESSION_ID_HEADER)
+        counted = session_id in self._server_instances and scope["method"] != "GET"
+
+        now = time.monotonic()
+        await self._sweep(now)
+        if session_id in self._ended:
+            # 404 tells the client to initialize a new session
+            response = Response(
+                f"Not Found: session expired ({self._ended[session_id]})",
+                status_code=HTTPStatus.NOT_FOUND,
+            )
+            await response(scope, receive, send)
+            return
+        if session_id is None and not await self._make_room():
+            response = Response(
+                f"Service Unavailable: all {self._max_sessions} sessions are busy",
+                status_code=HTTPStatus.SERVICE_UNAVAILABLE,
+            )
+            await response(scope, receive, send)
+            return
+
+        if session_id in self._server_instances:
+            self._last_seen[session_id] = now
+        if counted:
+            self._busy[session_id] = self._busy.get(session_id, 0) + 1
+        try:
+            await super()._handle_stateful_request(scope, receive, send)
+        finally:
+            now = time.monotonic()
+            if counted and session_id in self._busy:
+                self._busy[session_id] -= 1
+            for known in self._server_instances:
+                self._last_seen.setdefault(known, now)
+            if session_id in self._last_seen:
+                self._last_seen[session_id] = now
+            transport = self._server_instances.get(session_id)
+            if transport is not None and transport._terminated:
+                await self._end_session(session_id, "terminated")
@@ -0,0 +1,245 @@
+import logging
+import threading
+import numpy as np
+from tabulate import tabulate
+from .database import DatabaseClient
+
+logger = logging.getLogger("mcp_server_motherduck")
+
+AERO_PARAMS_TABLE = "project_aero_params"
+
+# Columns that identify a row rather than describe the project
+AERO_KEY_COLUMNS = {"aero_row_num", "project_id"}
+
+NUMERIC_TYPE_PREFIXES = (
+    "TINYINT",
+    "SMALLINT",
+    "INTEGER",
+    "BIGINT",
+    "HUGEINT",
+    "UTINYINT",
+    "USMALLINT",
+    "UINTEGER",
+    "UBIGINT",
+    "FLOAT",
+    "REAL",
+    "DOUBLE",
+    "DECIMAL",
+)
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+class ProjectSimilarityIndex:
+    """
+    Cached, normalized feature matrix over `project_aero_params` for kNN search.
+
+    Numeric columns are z-scored (missing values land on the column mean) and
+    categorical (VARCHAR and BOOLEAN) columns are one-hot encoded; other types,
+    e.g. dates, are not used. The matrix is rebuilt only when the fingerprint of
+    the params rows joined with their project code and name changes.
+    """
+
+    def __init__(self, db_client: DatabaseClient, categorical_weight: float = 1.0):
+        self._db = db_client
+        self._categorical_weight = categorical_weight
+        self._lock = threading.Lock()
+        self._fingerprint = None
+        self._numeric_columns: list[str] = []
+        self._categorical_columns: list[str] = []
+        self._unused_columns: list[str] = []
+        self._categories: dict[str, list[str]] = {}
+        self._means = np.empty(0)
+        self._stds = np.empty(0)
+        self._matrix = np.empty((0, 0))
+        self._project_ids = np.empty(0)
+        self._labels: list[tuple] = []
+        self._raw: list[tuple] = []
+
+    def _current_fingerprint(self) -> tuple:
+        # covers the project labels too, so renames rebuild the index
+        _, rows = self._db.fetch(
+            f"""
+            SELECT count(*), sum(hash(pap, p.code, p.name))
+            FROM {AERO_PARAMS_TABLE} pap
+            JOIN projects p ON p.project_id = pap.project_id
+            """
+        )
+        return rows[0]
+
+    def _discover_columns(self) -> None:
+        _, rows = self._db.fetch(f"DESCRIBE {AERO_PARAMS_TABLE}")
+        self._numeric_columns = []
+        self._categorical_columns = []
+        self._unused_columns = []
+        for column_name, column_type, *_ in rows:
+            if column_name in AERO_KEY_COLUMNS:
+                continue
+            if column_type.upper().startswith(NUMERIC_TYPE_PREFIXES):
+                self._numeric_columns.append(column_name)
+            elif column_type.upper() in ("VARCHAR", "BOOLEAN"):
+                self._categorical_columns.append(column_name)
+            else:
+                self._unused_columns.append(column_name)
+
+    def _load(self, fingerprint: tuple) -> None:
+        self._discover_columns()
+
+        select_list = ", ".join(
+            [f"CAST(pap.{_quote(c)} AS DOUBLE)" for c in self._numeric_columns]
+            + [f"CAST(pap.{_quote(c)} AS VARCHAR)" for c in self._categorical_columns]
+        )
+        _, rows = self._db.fetch(
+            f"""
+            SELECT p.project_id, p.code, p.name{", " + select_list if select_list else ""}
+            FROM {AERO_PARAMS_TABLE} pap
+            JOIN projects p ON p.project_id = pap.project_id
+            ORDER BY p.project_id
+            """
+        )
+
+        n_numeric = len(self._numeric_columns)
+        self._project_ids = np.array([r[0] for r in rows])
+        self._labels = [(r[1], r[2]) for r in rows]
+        self._raw = [r[3:] for r in rows]
+
+        numeric = np.array(
+            [[np.nan if v is None else v for v in r[3 : 3 + n_numeric]] for r in rows],
+            dtype=np.float64,
+        ).reshape(len(rows), n_numeric)
+        with np.errstate(invalid="ignore"):
+            self._means = np.nanmean(numeric, axis=0) if len(rows) else np.zeros(n_numeric)
+            self._stds = np.nanstd(numeric, axis=0) if len(rows) else np.ones(n_numeric)
+        self._means = np.nan_to_num(self._means)
+        self._stds = np.where(np.nan_to_num(self._stds) > 0, self._stds, 1.0)
+
+        categorical = [r[3 + n_numeric :] for r in rows]
+        self._categories = {
+            column: sorted({r[i] for r in categorical if r[i] is not None})
+            for i, column in enumerate(self._categorical_columns)
+        }
+
+        self._matrix = self._encode(numeric, categorical)
+        self._fingerprint = fingerprint
+        logger.info(
+            f"Built similarity index over {len(rows)} projects "
+            f"({n_numeric} numeric, {len(self._categorical_columns)} categorical features)"
+        )
+
+    def _encode(self, numeric: np.ndarray, categorical: list) -> np.ndarray:
+        """Encode raw feature rows into the normalized feature space"""
+        scaled = np.nan_to_num((numeric - self._means) / self._stds)
+        blocks = [scaled]
+        for i, column in enumerate(self._categorical_columns):
+            values = np.array([r[i] for r in categorical], dtype=object)
+            categories = np.array(self._categories[column], dtype=object)
+            one_hot = (values[:, None] == categories[None, :]).astype(np.float64)
+            blocks.append(one_hot * self._categorical_weight)
+        return np.hstack(blocks) if blocks else np.empty((len(categorical), 0))
+
+    def refresh(self) -> None:
+        """Rebuild the feature matrix if the params table changed"""
+        fingerprint = self._current_fingerprint()
+        with self._lock:
+            if fingerprint != self._fingerprint:
+                self._load(fingerprint)
+
+    def invalidate(self) -> None:
+        """Force a rebuild on the next search"""
+        with self._lock:
+            self._fingerprint = None
+
+    def _query_vector(
+        self, project_code: str | None, params: dict | None
+    ) -> tuple[np.ndarray, object]:
+        if project_code is not None:
+            for i, (code, _) in enumerate(self._labels):
+                if code == project_code:
+                    return self._matrix[i], self._project_ids[i]
+            raise ValueError(
+                f"Project `{project_code}` has no linked row in `{AERO_PARAMS_TABLE}`"
+            )
+
+        if not params:
+            raise ValueError("Provide either `project_code` or `params`")
+
+        unused = set(params) & set(self._unused_columns)
+        if unused:
+            raise ValueError(
+                f"Column(s) {', '.join(sorted(unused))} of `{AERO_PARAMS_TABLE}` are not "
+                "used for similarity: only numeric, text and boolean columns are"
+            )
+        unknown = set(params) - set(self._numeric_columns) - set(self._categorical_columns)
+        if unknown:
+            raise ValueError(f"Unknown feature(s): {', '.join(sorted(unknown))}")
+
+        numeric = np.array(
+            [[params.get(c, np.nan) for c in self._numeric_columns]], dtype=np.float64
+        )
+        # categories are compared as text, BOOLEAN columns as 'true'/'false'
+        categorical = [
+            tuple(
+                str(v).lower() if isinstance(v, bool) else v
+                for v in (params.get(c) for c in self._categorical_columns)
+            )
+        ]
+        return self._encode(numeric, categorical)[0], None
+
+    def search(
+        self,
+        project_code: str | None = None,
+        params: dict | None = None,
+        k: int = 5,
+        metric: str = "cosine",
+    ) -> str:
+        """Return the top-k most similar projects as a rendered table"""
+        self.refresh()
+
+        with self._lock:
+            if len(self._project_ids) == 0:
+                return "No projects with aerospace parameters available"
+
+            vector, exclude_id = self._query_vector(project_code, params)
+            matrix = self._matrix
+
+            if metric == "cosine":
+                norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(vector)
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    scores = np.where(norms > 0, matrix @ vector / norms, 0.0)
+                order_scores = -scores
+            elif metric == "euclidean":
+                scores = np.sqrt(np.maximum(((matrix - vector) ** 2).sum(axis=1), 0.0))
+                order_scores = scores
+            else:
+                raise ValueError(f"Unsupported metric: {metric}")
+
+            if exclude_id is not None:
+                order_scores = np.where(
+                    self._project_ids == exclude_id, np.inf, order_scores
+                )
+
+            candidates = int(np.isfinite(order_scores).sum())
+            if candidates == 0:
+                return "No other projects with aerospace parameters to compare with"
+            k = max(1, min(k, candidates))
+            top = np.argpartition(order_scores, k - 1)[:k]
+            top = top[np.argsort(order_scores[top])]
+
+            feature_columns = self._numeric_columns + self._categorical_columns
+            rows = [
+                (
+                    self._labels[i][0],
+                    self._labels[i][1],
+                    round(float(scores[i]), 4),
+                    *self._raw[i],
+                )
+                for i in top
+            ]
+
+        return tabulate(
+            rows,
+            headers=["code", "name", metric] + feature_columns,
+            tablefmt="pretty",
+        )
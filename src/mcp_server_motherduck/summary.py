@@ -0,0 +1,107 @@
+import uuid
+import duckdb
+from contextlib import contextmanager
+from collections.abc import Iterator
+from tabulate import tabulate
+from .preflight import statement_text
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+@contextmanager
+def materialized(
+    cursor: duckdb.DuckDBPyConnection, query: str
+) -> Iterator[tuple[str, list[str]]]:
+    """
+    Run a single SELECT once into a temp table, yielding its name and the
+    query's own column names, and drop the table afterwards. The table renames
+    duplicate columns (`id`, `id_1`), so results are rendered with the names
+    taken from `DESCRIBE` instead.
+    """
+    statement = statement_text(cursor.extract_statements(query)[0].query)
+    table = f"mcp_summary_{uuid.uuid4().hex}"
+
+    # newline so that a trailing `--` comment cannot swallow the rest
+    names = [row[0] for row in cursor.execute(f"DESCRIBE {statement}\n").fetchall()]
+    cursor.execute(f"CREATE TEMP TABLE {table} AS {statement}\n")
+    try:
+        yield table, names
+    finally:
+        cursor.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+def estimated_render_bytes(
+    cursor: duckdb.DuckDBPyConnection, table: str, headers: list[str]
+) -> int:
+    """
+    Approximate size of the `tabulate` "pretty" rendering of a table, from the
+    widest value of each column as computed in-engine, without fetching rows
+    """
+    columns = [d[0] for d in cursor.execute(f"SELECT * FROM {table} LIMIT 0").description]
+    widths = "".join(
+        f", max(strlen(coalesce(CAST({_quote(c)} AS VARCHAR), '')))" for c in columns
+    )
+    row_count, *cell_widths = cursor.execute(
+        f"SELECT count(*){widths} FROM {table}"
+    ).fetchone()
+    line = 1 + sum(
+        max(width or 0, *(len(part) for part in header.split("\n"))) + 3
+        for width, header in zip(cell_widths, headers)
+    )
+    # two header lines and three borders around the rows
+    return (row_count + 5) * (line + 1) - 1
+
+
+def summarize_table(
+    cursor: duckdb.DuckDBPyConnection,
+    table: str,
+    top_k: int = 5,
+    sample_rows: int = 10,
+) -> tuple[str, int]:
+    """
+    Render a compact profile of a materialized result instead of its rows.
+    Returns the profile and the number of rows in the full result.
+
+    The table is profiled in-engine with `SUMMARIZE`, `approx_top_k` and a
+    reservoir sample.
+    """
+    q = cursor.execute(f"SUMMARIZE {table}")
+    stats_headers = [d[0] for d in q.description]
+    stats = q.fetchall()
+    columns = [row[0] for row in stats]
+    row_count = stats[0][stats_headers.index("count")] if stats else 0
+
+    top_values = []
+    if columns:
+        top = cursor.execute(
+            "SELECT "
+            + ", ".join(f"approx_top_k({_quote(c)}, {top_k})" for c in columns)
+            + f" FROM {table}"
+        ).fetchone()
+        top_values = [
+            (column, ", ".join(str(v) for v in values))
+            for column, values in zip(columns, top)
+        ]
+
+    q = cursor.execute(
+        f"SELECT * FROM {table} "
+        f"USING SAMPLE reservoir({sample_rows} ROWS) REPEATABLE (42)"
+    )
+    sample_headers = [d[0] + "\n" + d[1] for d in q.description]
+    sample = q.fetchall()
+
+    profile = "\n\n".join(
+        [
+            f"Result too large to return in full: {row_count} rows x {len(columns)} columns. "
+            "Showing a summary instead; refine the query (filters, aggregations, LIMIT) to get the rows.",
+            "Column statistics:\n"
+            + tabulate(stats, headers=stats_headers, tablefmt="pretty"),
+            f"Top {top_k} values per column (approximate):\n"
+            + tabulate(top_values, headers=["column", "values"], tablefmt="pretty"),
+            f"Sample of {len(sample)} rows:\n"
+            + tabulate(sample, headers=sample_headers, tablefmt="pretty"),
+        ]
+    )
+    return profile, row_count
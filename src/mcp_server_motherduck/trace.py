@@ -0,0 +1,76 @@
+import json
+import atexit
+import logging
+import threading
+from queue import SimpleQueue
+
+logger = logging.getLogger("mcp_server_motherduck")
+
+_STOP = object()
+
+
+class TraceRecorder:
+    """
+    Append one JSON line per tool call to a trace file.
+
+    Records carry the full (untruncated) arguments so they can be replayed with
+    `mcp-server-motherduck-replay`. Writes happen on a background thread so that
+    tool calls never wait on the disk.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._queue = SimpleQueue()
+        self._file = open(path, "a", encoding="utf-8")
+        self._thread = threading.Thread(
+            target=self._write_loop, name="mcp-trace-writer", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+        logger.info(f"Recording tool call traces to `{path}`")
+
+    def _write_loop(self) -> None:
+        while True:
+            record = self._queue.get()
+            if record is _STOP:
+                break
+            self._file.write(json.dumps(record, default=str, ensure_ascii=False) + "\n")
+            if self._queue.empty():
+                self._file.flush()
+        self._file.close()
+
+    def record(
+        self,
+        tool: str,
+        arguments: dict | None,
+        session_id: str | None,
+        started_at: float,
+        duration_ms: float,
+        status: str,
+        rows: int | None = None,
+        result_bytes: int | None = None,
+    ) -> None:
+        self._queue.put(
+            {
+                "ts": round(started_at, 6),
+                "tool": tool,
+                "arguments": arguments,
+                "session_id": session_id,
+                "duration_ms": round(duration_ms, 3),
+                "status": status,
+                "rows": rows,
+                "result_bytes": result_bytes,
+            }
+        )
+
+    def close(self) -> None:
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+
+
+def read_trace(path: str) -> list[dict]:
+    """Load a trace file, ordered by start time"""
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return sorted(records, key=lambda r: r["ts"])
@@ -0,0 +1,141 @@
+import atexit
+import math
+import os
+import re
+import shutil
+import logging
+import tempfile
+from typing import Any
+
+logger = logging.getLogger("mcp_server_motherduck")
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+
+# Share of the container memory given to DuckDB, the rest is left to Python and the OS
+MEMORY_FRACTION = 0.75
+
+# cgroup v1 reports "no limit" as a huge page-aligned number
+UNLIMITED_MEMORY_THRESHOLD = 1 << 60
+
+
+def _read(path: str) -> str | None:
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def cgroup_cpu_limit() -> float | None:
+    """Number of CPUs the container may use, or None when unlimited"""
+    # cgroup v2: "<quota> <period>" or "max <period>"
+    cpu_max = _read(os.path.join(CGROUP_ROOT, "cpu.max"))
+    if cpu_max:
+        quota, _, period = cpu_max.partition(" ")
+        if quota != "max" and period:
+            return int(quota) / int(period)
+        return None
+
+    # cgroup v1
+    quota = _read(os.path.join(CGROUP_ROOT, "cpu", "cpu.cfs_quota_us"))
+    period = _read(os.path.join(CGROUP_ROOT, "cpu", "cpu.cfs_period_us"))
+    if quota and period and int(quota) > 0:
+        return int(quota) / int(period)
+    return None
+
+
+def cgroup_memory_limit() -> int | None:
+    """Memory limit of the container in bytes, or None when unlimited"""
+    for path in (
+        os.path.join(CGROUP_ROOT, "memory.max"),
+        os.path.join(CGROUP_ROOT, "memory", "memory.limit_in_bytes"),
+    ):
+        value = _read(path)
+        if value is None:
+            continue
+        if value == "max" or int(value) >= UNLIMITED_MEMORY_THRESHOLD:
+            return None
+        return int(value)
+    return None
+
+
+# Units accepted by DuckDB's `memory_limit`
+MEMORY_UNITS = {
+    "b": 1,
+    "kb": 1000,
+    "mb": 1000**2,
+    "gb": 1000**3,
+    "tb": 1000**4,
+    "kib": 1024,
+    "mib": 1024**2,
+    "gib": 1024**3,
+    "tib": 1024**4,
+}
+
+
+def parse_memory_limit(value: str) -> int:
+    """Size in bytes of a DuckDB memory setting such as `4GB` or `512MiB`"""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([a-zA-Z]+)\s*", value)
+    if match is None or match.group(2).lower() not in MEMORY_UNITS:
+        raise ValueError(f"Invalid memory limit `{value}`, expected e.g. `4GB` or `512MiB`")
+    return int(float(match.group(1)) * MEMORY_UNITS[match.group(2).lower()])
+
+
+def _instance_temp_directory(temp_directory: str | None = None) -> str:
+    """Fresh spill directory for one DuckDB instance, removed at exit"""
+    # Instances sharing a spill directory overwrite each other's temp files
+    if temp_directory is not None:
+        os.makedirs(temp_directory, exist_ok=True)
+    path = tempfile.mkdtemp(prefix="mcp-server-motherduck-", dir=temp_directory)
+    atexit.register(shutil.rmtree, path, ignore_errors=True)
+    return path
+
+
+def derive_settings(
+    threads: int | None = None,
+    memory_limit: str | None = None,
+    temp_directory: str | None = None,
+    enable_object_cache: bool | None = None,
+    allow_spill: bool = True,
+    instances: int = 1,
+) -> dict[str, Any]:
+    """
+    DuckDB settings sized from the container's cgroup limits.
+
+    Explicit arguments take precedence over derived values. Settings that can't
+    be derived (e.g. no memory limit on the cgroup) are left to DuckDB's defaults.
+    The memory budget is split evenly across `instances` DuckDB instances, and
+    each call gets its own spill directory (inside `temp_directory` if given).
+    """
+    settings: dict[str, Any] = {}
+
+    cpu_limit = cgroup_cpu_limit()
+    if threads is not None:
+        settings["threads"] = threads
+    elif cpu_limit is not None:
+        settings["threads"] = max(1, math.floor(cpu_limit))
+
+    memory_bytes = cgroup_memory_limit()
+    budget = None
+    if memory_limit is not None:
+        budget = parse_memory_limit(memory_limit)
+    elif memory_bytes is not None:
+        budget = int(memory_bytes * MEMORY_FRACTION)
+    if budget is not None:
+        settings["memory_limit"] = f"{budget // instances // (1024 * 1024)}MiB"
+
+    # SaaS mode forbids local filesystem access, so there is nowhere to spill
+    if allow_spill:
+        settings["temp_directory"] = _instance_temp_directory(temp_directory)
+
+    settings["enable_object_cache"] = (
+        True if enable_object_cache is None else enable_object_cache
+    )
+
+    logger.info(
+        "DuckDB tuning: "
+        + f"cgroup cpus={cpu_limit if cpu_limit is not None else 'unlimited'}, "
+        + f"cgroup memory={memory_bytes if memory_bytes is not None else 'unlimited'}; "
+        + ", ".join(f"{name}={value}" for name, value in settings.items())
+    )
+    return settings